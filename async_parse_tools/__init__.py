@@ -1,8 +1,24 @@
 from .async_base import *
 from .async_downloader import AsyncDownloader, LengthError, FakeStringArray
+from .adaptive import AdaptiveConcurrency
 from .async_requests import AsyncRequests, ClientSession
+from .dns_cache import DnsCache
+from .errors import ErrorCollector, ErrorInfo
+from .folder_index import FolderIndex
+from .hash_store import HashStore
+from .http_cache import HttpCache
+from .journal import Journal
+from .metrics import Metrics, RequestTrace
+from .host_limits import HostLimiter, TokenBucket
+from .retry import RetryPolicy
+from .sharding import RemoteError
+from .sinks import ResultSink, JsonlSink, CsvSink, SqliteSink, CallbackSink, RunStats
 from .utils import *
+from .watchdog import LoopWatchdog, SlowCallback
 try:
     from .async_browser import AsyncBrowser, BrowserType, Page
+    from .async_hybrid import AsyncHybrid, default_needs_browser, missing_text
+    from .block_rules import BlockRules, TRACKER_DOMAINS
+    from .page_pool import PagePool
 except ModuleNotFoundError:
     pass
@@ -0,0 +1,192 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Callable
+
+import aiohttp
+
+from .host_limits import get_host
+
+CONGESTION_STATUSES = (408, 429, 502, 503, 504)
+CONGESTION_EXCEPTIONS = (asyncio.TimeoutError, aiohttp.ServerDisconnectedError, aiohttp.ClientConnectionError)
+
+
+class AimdLimit:
+    """
+    Limit of concurrent requests changed by AIMD algorithm.
+    Every successful request with healthy latency increases limit by increase / limit
+    (by increase per limit of requests), congestion (errors or latency above baseline * latency_tolerance)
+    decreases it multiplicatively by decrease factor once per round: requests started before
+    last decrease do not decrease it again.
+    Baseline is the lowest smoothed latency, which slowly grows if server becomes slower.
+    """
+
+    def __init__(self, initial: float, min_limit=1, max_limit=100, increase=1.0, decrease=0.5,
+                 latency_tolerance: float | None = 2.5, smoothing=0.2, name=None,
+                 on_change: Callable[[str | None, int], Any] | None = None, history: list | None = None):
+        self.limit = float(min(max(initial, min_limit), max_limit))
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_tolerance = latency_tolerance
+        self.smoothing = smoothing
+        self.name = name
+        self.on_change = on_change
+        self.history = history if history is not None else []
+
+        self.active = 0
+        self.latency = None
+        self.baseline = None
+        self._round = 0
+        self._waiters: deque[asyncio.Future] = deque()
+        self._record()
+
+    def _record(self):
+        self.history.append((time.time(), self.name, int(self.limit)))
+        if self.on_change is not None:
+            self.on_change(self.name, int(self.limit))
+
+    def _set_limit(self, limit: float):
+        old = int(self.limit)
+        self.limit = min(max(limit, self.min_limit), self.max_limit)
+        if int(self.limit) != old:
+            self._record()
+
+    async def acquire(self) -> int:
+        """Returns number of round, in which request is started"""
+
+        while self.active >= int(self.limit):
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                else:
+                    # Slot was given to this waiter, it is passed to the next one
+                    self._wake()
+                raise
+        self.active += 1
+        return self._round
+
+    def release(self, request_round: int, latency: float | None, congestion: bool):
+        """Releasing of slot, latency is None if request was cancelled"""
+        self._update(request_round, latency, congestion)
+        self.active -= 1
+        self._wake()
+
+    def _wake(self):
+        free = int(self.limit) - self.active
+        while free > 0 and self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                free -= 1
+
+    def _update(self, request_round: int, latency: float | None, congestion: bool):
+        if latency is None:
+            return
+        if not congestion:
+            self.latency = latency if self.latency is None else \
+                self.latency + self.smoothing * (latency - self.latency)
+            self.baseline = self.latency if self.baseline is None else \
+                min(self.baseline * 1.001, self.latency)
+            congestion = bool(self.latency_tolerance) and self.latency > self.baseline * self.latency_tolerance
+
+        if congestion:
+            if request_round == self._round:
+                self._round += 1
+                self._set_limit(self.limit * self.decrease)
+        elif self.active >= int(self.limit):
+            # Limit grows only if it is used
+            self._set_limit(self.limit + self.increase / self.limit)
+
+
+class AdaptiveRequest:
+    """
+    Timing of request under adaptive limit.
+    Latency is measured from begin() (called after waiting for all other slots, or from acquiring of
+    adaptive slot) to headers_received(), so reading of body is not counted.
+    If headers are not received, latency is measured to the end of request.
+    """
+
+    __slots__ = ('start', 'latency')
+
+    def __init__(self):
+        self.start = time.monotonic()
+        self.latency = None
+
+    def begin(self):
+        self.start = time.monotonic()
+
+    def headers_received(self):
+        if self.latency is None:
+            self.latency = time.monotonic() - self.start
+
+    def elapsed(self) -> float:
+        return self.latency if self.latency is not None else time.monotonic() - self.start
+
+
+class AdaptiveConcurrency:
+    """
+    Adaptive limit of concurrent requests (AIMD) for all requests or separately for every host.
+    Limit starts from initial and is kept between min_limit and max_limit.
+    history - list of (time, host or None, limit) of every change of limit.
+    """
+
+    def __init__(self, max_limit: int, min_limit=1, initial: int | None = None, per_host=False, increase=1.0,
+                 decrease=0.5, latency_tolerance: float | None = 2.5,
+                 congestion_statuses: tuple[int, ...] = CONGESTION_STATUSES,
+                 on_change: Callable[[str | None, int], Any] | None = None):
+        if not 0 < decrease < 1:
+            raise ValueError('decrease must be between 0 and 1')
+        self.max_limit = max_limit
+        self.min_limit = min(min_limit, max_limit)
+        self.initial = initial if initial is not None else max(self.min_limit, max_limit // 4)
+        self.per_host = per_host
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_tolerance = latency_tolerance
+        self.congestion_statuses = congestion_statuses
+        self.on_change = on_change
+        self.history: list[tuple[float, str | None, int]] = []
+        self._limits: dict[str | None, AimdLimit] = {}
+
+    def _get_limit(self, url) -> AimdLimit:
+        key = get_host(url) if self.per_host else None
+        limit = self._limits.get(key)
+        if limit is None:
+            limit = AimdLimit(self.initial, self.min_limit, self.max_limit, self.increase, self.decrease,
+                              self.latency_tolerance, name=key, on_change=self.on_change, history=self.history)
+            self._limits[key] = limit
+        return limit
+
+    @property
+    def limits(self) -> dict[str | None, int]:
+        """Current limits by host (None key if limit is common)"""
+        return {k: int(v.limit) for k, v in self._limits.items()}
+
+    def is_congestion(self, error: BaseException) -> bool:
+        if isinstance(error, aiohttp.ClientResponseError):
+            return error.status in self.congestion_statuses
+        return isinstance(error, CONGESTION_EXCEPTIONS)
+
+    @asynccontextmanager
+    async def limit(self, url):
+        """Yields AdaptiveRequest, which measures latency of request"""
+
+        limit = self._get_limit(url)
+        request_round = await limit.acquire()
+        request = AdaptiveRequest()
+        try:
+            yield request
+        except Exception as e:
+            limit.release(request_round, request.elapsed(), self.is_congestion(e))
+            raise
+        except BaseException:
+            limit.release(request_round, None, False)
+            raise
+        limit.release(request_round, request.elapsed(), False)
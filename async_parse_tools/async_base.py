@@ -1,16 +1,34 @@
 import asyncio
-import gc
-
-from asyncio_pool import AioPool
+import inspect
 import platform
+import time
+import weakref
 from abc import abstractmethod, ABC
+from collections import deque
+from collections.abc import AsyncIterable, Hashable, Sized
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
 from functools import wraps
-from typing import Generator, Iterable
+from typing import Any, Awaitable, Callable, Generator, Iterable
 
+import aiohttp
 import tqdm
-import tqdm.asyncio
-
+from aiohttp.abc import AbstractResolver
+
+from .adaptive import AdaptiveConcurrency
+from .dns_cache import DnsCache
+from .errors import ErrorCollector
+from .host_limits import HostLimiter
+from .journal import Journal
+from .metrics import Metrics, RequestTrace
+from .retry import RetryPolicy
+from .sharding import iter_sharded
+from .sinks import ResultSink, RunStats
 from .utils import get_random_user_agent
+from .watchdog import LoopWatchdog, SlowCallback
+
+# Ошибки текущего задания, используются для записи результата в журнал
+_task_errors: ContextVar[list | None] = ContextVar('task_errors', default=None)
 
 
 class AsyncBase(ABC):
@@ -18,15 +36,30 @@ class AsyncBase(ABC):
     Абстрактный класс, объявляющий интерфейс и добавляющий базовые функции
     """
 
+    # Атрибуты, существующие только во время запуска и не передающиеся в другие процессы
+    _runtime_attributes = ('sink',)
+    # Тип результата run, с которым совпадает результат run_sharded
+    _output_type: Callable[[list], Any] = tuple
+
     def __init__(self):
         self.use_statusbar = True
         self.statusbar_ascii = False
         self.print_errors_string = True
 
-        self.errors = []
         self.max_tries = 5
         self.error_wait_time = 2
         self.return_errors = False
+        self.errors_path = None
+        self.errors_in_memory = None
+        self.errors = ErrorCollector()
+        self.retry_policy = None
+        self._retries_used = 0
+        self.journal = None
+        self.sink = None
+        self.return_stats = False
+        self.metrics = None
+        self.watchdog = None
+        self._running = False
 
         self.run_async = self._return_decorator(self.run_async)
 
@@ -36,25 +69,136 @@ class AsyncBase(ABC):
         self.print_errors_string = print_errors_string
         return self
 
-    def error_settings(self, max_tries=5, error_wait_time=2, return_errors=False):
+    def error_settings(self, max_tries=5, error_wait_time=2, return_errors=False,
+                       errors_path: str | None = None, errors_in_memory: int | None = None):
         """
-        If return_errors is True, run and run_async returns tuple(output, list[errors])
+        If return_errors is True, run and run_async returns tuple(output, ErrorCollector)
+        If errors_path is set, errors are appended to JSONL file,
+        and only last errors_in_memory errors are kept in memory.
         """
         self.max_tries = max_tries
         self.error_wait_time = error_wait_time
         self.return_errors = return_errors
+        self.errors_path = errors_path
+        self.errors_in_memory = errors_in_memory
+        return self
+
+    def set_retry_policy(self, retry_policy: RetryPolicy | None):
+        """
+        Setting of retry policy (exponential backoff, status and exception filters, Retry-After, budget).
+        If retry_policy is None, any error is retried max_tries times with fixed error_wait_time delay.
+        """
+        self.retry_policy = retry_policy
         return self
 
+    def set_journal(self, journal: str | Journal | None, store_results=False, retry_failed=True, batch_size=100):
+        """
+        Journal of processed items in SQLite database for resuming of interrupted runs.
+        Items, which are done in previous runs, are skipped; failed and unfinished items are processed again
+        (failed are skipped too, if retry_failed is False).
+        Items are identified by url or by 'key' of dict items.
+        If store_results is True, results are saved (pickled) and returned for skipped items, otherwise None.
+        States are written in thread by batches of batch_size items.
+        """
+
+        if isinstance(journal, str):
+            journal = Journal(journal, store_results, retry_failed, batch_size)
+        self.journal = journal
+        return self
+
+    def set_sink(self, sink: ResultSink | None, return_stats=False):
+        """
+        Results are passed to sink (JsonlSink, CsvSink, SqliteSink, CallbackSink) as they complete.
+        If return_stats is True, results are not kept in memory and run returns RunStats.
+        """
+
+        self.sink = sink
+        self.return_stats = return_stats
+        return self
+
+    def set_metrics(self, metrics: Metrics | bool | None = True, callback: Callable[[RequestTrace], Any] | None = None,
+                    path: str | None = None, format='json', interval: float | None = None):
+        """
+        Collecting of metrics: timings of requests (dns, connect, ttfb, body) and callbacks, bytes,
+        reuse of connections, retries and status counts by host. Metrics are available in self.metrics.
+        callback(trace) is called for every finished request.
+        If path is set, snapshot ('json' or 'prometheus' format) is written to file at the end of run
+        and every interval seconds during run.
+        """
+
+        if metrics is True:
+            metrics = Metrics(callback, path, format, interval)
+        self.metrics = metrics or None
+        return self
+
+    def set_watchdog(self, threshold: float | None = 0.1, interval=0.05, sample_stacks=True,
+                     on_slow: Callable[[SlowCallback], Any] | None = None, path: str | None = None):
+        """
+        Watchdog of event loop: measures loop lag and reports async callbacks, which block loop
+        longer than threshold seconds, with url and stack sample (on_slow(SlowCallback), printed by default).
+        CPU time of callbacks is collected to histograms. Report is available with self.watchdog.report()
+        and is written to JSON file path at the end of run.
+        If threshold is None, watchdog is disabled.
+        """
+
+        self.watchdog = None if threshold is None else LoopWatchdog(threshold, interval, sample_stacks, on_slow, path)
+        return self
+
+    def _get_retry_policy(self) -> RetryPolicy:
+        if self.retry_policy is None:
+            return RetryPolicy.fixed(self.max_tries, self.error_wait_time)
+        return self.retry_policy
+
+    def _reset_run_state(self):
+        """Сброс состояния перед запуском. Запуски одного экземпляра не должны пересекаться"""
+        if self._running:
+            raise RuntimeError(f'{self.__class__.__name__} is already running, runs of one instance must not overlap. '
+                               f'Use separate instances for concurrent runs')
+        self._running = True
+        self._retries_used = 0
+        self.errors.close()
+        self.errors = ErrorCollector(self.errors_path, self.errors_in_memory)
+        if self.journal is not None:
+            self.journal.skipped = 0
+
+    def _finish_run(self):
+        """Закрытие файлов после запуска"""
+        self._running = False
+        self.errors.close()
+        if self.journal is not None:
+            self.journal.close()
+        if self.metrics is not None:
+            self.metrics.finish_run()
+        if self.watchdog is not None:
+            self.watchdog.stop()
+
     def _return_decorator(self, func):
         @wraps(func)
         async def inner(*args, **kwargs):
-            output = await func(*args, **kwargs)
+            self._reset_run_state()
+            try:
+                output = await func(*args, **kwargs)
+            finally:
+                self._finish_run()
             if self.return_errors:
                 return output, self.errors
             return output
 
         return inner
 
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop('run_async', None)
+        state['errors'] = ErrorCollector()
+        state['_running'] = False
+        for key in self._runtime_attributes:
+            state[key] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.run_async = self._return_decorator(self.run_async)
+
     def windows_fix(self):
         if platform.system() == 'Windows':
             current_policy = asyncio.get_event_loop_policy()
@@ -70,94 +214,332 @@ class AsyncBase(ABC):
     async def run_async(self, *args, **kwargs):
         pass
 
-    async def _start_tasks(self, tasks):
-        """Простой метод запуска выполнения заданий"""
+    def run_sharded(self, urls, *args, processes: int | None = None, ordered=True, shard_by_host=False,
+                    chunk_size=100):
+        """
+        Sync start in several processes, each one with own event loop and session.
+        urls are split between processes by chunks (by host, if shard_by_host is True,
+        to keep connections alive). Results are returned in input order or as completed.
+        Arguments of run (callback functions) must be picklable, results too.
+        """
 
-        awaited_tasks = (asyncio.create_task(t) for t in tasks)
-        if self.use_statusbar:
-            output = await tqdm.asyncio.tqdm.gather(*awaited_tasks, ascii=self.statusbar_ascii)
-        else:
-            output = await asyncio.gather(*awaited_tasks)
+        self._reset_run_state()
+        try:
+            results = self.iter_sharded(urls, *args, processes=processes, ordered=ordered,
+                                        shard_by_host=shard_by_host, chunk_size=chunk_size)
+            if self.sink is None and not self.return_stats:
+                output = self._output_type(results)
+            else:
+                output = asyncio.run(self._collect(self._iter_in_thread(results), self._output_type))
+        finally:
+            self._finish_run()
 
+        self._print_errors()
+        if self.return_errors:
+            return output, self.errors
         return output
 
-    async def _start_tasks_as_completed(self, tasks):
-        if self.use_statusbar:
-            for result in  tqdm.asyncio.tqdm.as_completed(tasks):
-                yield await result
-        else:
-            for result in asyncio.as_completed(tasks):
-                yield await result
+    def iter_sharded(self, urls, *args, processes: int | None = None, ordered=True, shard_by_host=False,
+                     chunk_size=100):
+        """
+        Generator version of run_sharded, errors of processes are added to self.errors.
+        Runner must have async generator _iter_run(urls, *args, ordered=True).
+        """
+
+        if not inspect.isasyncgenfunction(getattr(self, '_iter_run', None)):
+            raise NotImplementedError(f'{self.__class__.__name__} does not support sharded run')
+        return iter_sharded(self, urls, args, processes, ordered, shard_by_host, chunk_size)
+
+    async def _collect(self, results: AsyncIterable, output_type: Callable[[list], Any] | None = None):
+        """Передача результатов в sink и сбор их в output_type, либо подсчет RunStats при return_stats"""
+
+        start = time.monotonic()
+        output = []
+        items = count = 0
+        if self.sink is not None:
+            await self.sink.open()
+        try:
+            async for result in results:
+                items += 1
+                empty = self._is_empty_result(result)
+                count += not empty
+                if self.sink is not None and not (empty and self.sink.skip_none):
+                    await self.sink.add(result)
+                if not self.return_stats:
+                    output.append(result)
+        finally:
+            if self.sink is not None:
+                await self.sink.close()
+
+        if self.return_stats:
+            skipped = self.journal.skipped if self.journal is not None else 0
+            return RunStats(items, count, self.errors.total, skipped, time.monotonic() - start)
+        return (output_type or self._output_type)(output)
+
+    @staticmethod
+    def _is_empty_result(result) -> bool:
+        """Результат неудачного задания, не учитывается в RunStats.results и пропускается sink с skip_none"""
+        return result is None
+
+    @staticmethod
+    async def _iter_in_thread(iterator: Iterable):
+        """Асинхронный обход блокирующего итератора в отдельном потоке"""
+
+        iterator = iter(iterator)
+        end = object()
+        while (item := await asyncio.to_thread(next, iterator, end)) is not end:
+            yield item
+
+    async def _start_tasks(self, tasks, limit=100, length=None):
+        """Простой метод запуска выполнения заданий"""
 
+        return [x async for x in self._iter_tasks_limited(tasks, limit=limit, length=length)]
 
-    async def _start_tasks_limited(self, tasks: Generator | Iterable, limit=100, length=None,
-                                   gc_size=2000, ignore_output=False):
+    async def _start_tasks_as_completed(self, tasks, limit=100, length=None):
+        async for result in self._iter_tasks_limited(tasks, limit=limit, length=length, ordered=False):
+            yield result
+
+    async def _start_tasks_limited(self, tasks: Generator | Iterable, limit=100, length=None, ignore_output=False):
         """Метод запуска заданий с ограничением одновременных выполнений(потоков)"""
 
+        output = []
+        async for result in self._iter_tasks_limited(tasks, limit=limit, length=length):
+            if not ignore_output:
+                output.append(result)
+
+        if ignore_output:
+            return None
+
+        return tuple(output)
+
+    async def _iter_tasks_limited(self, tasks: Generator | Iterable[Awaitable] | AsyncIterable[Awaitable],
+                                  limit=100, length=None, ordered=True, window=None):
+        """
+        Движок запуска заданий с ограничением одновременных выполнений.
+        Задания берутся из синхронного или асинхронного итератора лениво,
+        одновременно выполняется не больше limit заданий.
+        Результаты отдаются по порядку (ordered=True) или по мере выполнения.
+        В режиме ordered готовые результаты ждут своей очереди в буфере размером window (по умолчанию limit * 4).
+        """
+
         if length is None:
-            length = len(tasks)
+            length = self._get_length(tasks)
+        if self.watchdog is not None:
+            self.watchdog.start()
+        window = max(window or limit * 4, limit) if ordered else limit
+
+        is_async = isinstance(tasks, AsyncIterable)
+        tasks = aiter(tasks) if is_async else iter(tasks)
+        exhausted = False
+        running = set()
+        queue = deque()
+        feeder = None
+        room = asyncio.Event()
+        spawned = None
+
+        def spawn(coro):
+            task = asyncio.ensure_future(coro)
+            running.add(task)
+            if ordered:
+                queue.append(task)
+
+        def has_room():
+            return not exhausted and len(running) < limit and len(queue) < window
+
+        def notify():
+            if spawned is not None and not spawned.done():
+                spawned.set_result(None)
+
+        async def feed():
+            """Задания асинхронного источника берутся, пока есть место, без ожидания следующего круга"""
+
+            nonlocal exhausted
+            try:
+                async for coro in tasks:
+                    spawn(coro)
+                    notify()
+                    while not has_room():
+                        room.clear()
+                        await room.wait()
+            finally:
+                exhausted = True
+                notify()
+
+        try:
+            with tqdm.tqdm(total=length, ascii=self.statusbar_ascii, disable=not self.use_statusbar) as pbar:
+                if is_async:
+                    feeder = asyncio.ensure_future(feed())
+                while True:
+                    if is_async:
+                        if feeder.done():
+                            # Ошибка источника
+                            feeder.result()
+                        if has_room():
+                            room.set()
+                    else:
+                        while has_room():
+                            try:
+                                spawn(next(tasks))
+                            except StopIteration:
+                                exhausted = True
+
+                    while queue and queue[0].done():
+                        yield queue.popleft().result()
+
+                    waiting = set(running)
+                    if is_async and not exhausted:
+                        spawned = asyncio.get_running_loop().create_future()
+                        waiting.add(spawned)
+                    if not waiting:
+                        if exhausted and not queue:
+                            break
+                        continue
+
+                    done, _ = await asyncio.wait(waiting, return_when=asyncio.FIRST_COMPLETED)
+                    done.discard(spawned)
+
+                    running -= done
+                    pbar.update(len(done))
+                    if not ordered:
+                        for task in done:
+                            yield task.result()
+        finally:
+            for task in running:
+                task.cancel()
+            if feeder is not None:
+                feeder.cancel()
+
+    @staticmethod
+    def _get_length(items):
+        """Возвращает количество элементов или None, если источник является итератором"""
+
+        if isinstance(items, str):
+            return 1
+        if isinstance(items, Sized):
+            return len(items)
+        return None
+
+    @staticmethod
+    def _map_items(items, func: Callable[[int, Any], Any]):
+        """
+        Ленивое применение func(index, item) к элементам источника.
+        Источником может быть строка, последовательность, синхронный или асинхронный итератор.
+        """
 
-        awaited_tasks = []
-        async with AioPool(size=limit) as pool:
-            if self.use_statusbar:
-                with tqdm.tqdm(total=length, ascii=self.statusbar_ascii) as pbar:
-                    for t in tasks:
-                        fut = await pool.spawn(t)
-                        pbar.update()
+        if isinstance(items, str):
+            items = (items,)
 
-                        if not ignore_output:
-                            awaited_tasks.append(fut)
+        if isinstance(items, AsyncIterable):
+            async def map_async():
+                index = 0
+                async for item in items:
+                    yield func(index, item)
+                    index += 1
 
-                        if not pbar.n % gc_size:
-                            gc.collect()
+            return map_async()
 
-            else:
-                count = 0
-                for t in tasks:
-                    count += 1
-                    fut = await pool.spawn(t)
+        return (func(index, item) for index, item in enumerate(items))
 
-                    if not ignore_output:
-                        awaited_tasks.append(fut)
+    @staticmethod
+    def _get_item_key(item) -> str | None:
+        """Ключ элемента для журнала: 'key' или 'url' словаря, либо сам url"""
 
-                    if not count % gc_size:
-                        gc.collect()
+        if isinstance(item, dict):
+            key = item.get('key') or item.get('url')
+        else:
+            key = item
+        return str(key).strip() if key else None
 
-        if ignore_output:
-            return None
+    async def _journaled(self, key: str | None, func: Callable[[], Awaitable], default=None):
+        """
+        Выполнение задания с записью в журнал.
+        Для пропущенных заданий возвращается сохраненный результат или default.
+        Задание считается неудачным, если во время выполнения была добавлена ошибка.
+        """
 
-        return tuple(x.result() for x in awaited_tasks)
+        if self.journal is None or key is None:
+            return await func()
+
+        skip, result = await self.journal.should_skip_async(key)
+        if skip:
+            return default if result is None else result
+
+        self.journal.mark_started(key)
+        errors = []
+        token = _task_errors.set(errors)
+        try:
+            result = await func()
+        finally:
+            _task_errors.reset(token)
+
+        if errors:
+            self.journal.mark_failed(key, repr(errors[-1]))
+        else:
+            self.journal.mark_done(key, result)
+        if self.journal.needs_flush:
+            await self.journal.flush_async()
+        return result
 
     def try_decorator(self, error_context=None):
         def try_decorator_inner(f):
             async def try_again(*args, **kwargs):
-                self.errors.clear()
-                tries = self.max_tries
-                while tries:
+                policy = self._get_retry_policy()
+                start = time.monotonic()
+                attempt = 0
+                while True:
+                    attempt += 1
                     try:
                         return await f(*args, **kwargs)
                     except Exception as e:
-                        tries -= 1
-                        last_error = (e, error_context)
-                        if tries:
-                            await asyncio.sleep(self.error_wait_time)
-                        else:
-                            self._add_error_info(*last_error)
+                        delay = policy.get_delay(e, attempt)
+                        if delay is None or not self._use_retry_budget(policy):
+                            self._add_error_info(e, error_context, getattr(e, 'status', None),
+                                                 attempt, time.monotonic() - start)
+                            return None
+                        if self.metrics is not None:
+                            self.metrics.add_retry(error_context)
+                        await asyncio.sleep(delay)
 
             return try_again
 
         return try_decorator_inner
 
-    def _add_error_info(self, error, task_info):
-        self.errors.append((error, task_info))
+    def _track(self, url, coro, callback=None):
+        """Выполнение callback под наблюдением watchdog"""
+
+        if self.watchdog is None:
+            return coro
+        return self.watchdog.track(url, coro, callback)
+
+    @contextmanager
+    def _timing(self, name):
+        """Измерение длительности блока для метрик"""
+
+        if self.metrics is None:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.metrics.observe(name, time.perf_counter() - start)
+
+    def _use_retry_budget(self, policy: RetryPolicy):
+        """Проверка и расходование общего лимита повторов на запуск"""
+
+        if policy.budget is not None and self._retries_used >= policy.budget:
+            return False
+        self._retries_used += 1
+        return True
+
+    def _add_error_info(self, error, task_info, status=None, attempts=1, elapsed=0.0):
+        self.errors.add(error, task_info, status, attempts, elapsed)
+        task_errors = _task_errors.get()
+        if task_errors is not None:
+            task_errors.append(error)
 
     def count_errors(self):
-        message = {}
-        for e in self.errors:
-            if e:
-                key = e[0].__class__.__name__ if isinstance(e[0], Exception) else e[0]
-                message[key] = message.get(key, 0) + 1
-        return message
+        return self.errors.counts
 
     def get_errors_string(self):
         return ', '.join(f'{k}: {v}' for k, v in self.count_errors().items())
@@ -167,14 +549,25 @@ class AsyncBase(ABC):
             print(self.get_errors_string())
 
 
-def concurrency_limit(n=3):
-    """Декоратор ограничивающий количество одновременных активных задач"""
-    sem = asyncio.Semaphore(value=n)
+def concurrency_limit(n=3, key: Callable[..., Hashable] | None = None):
+    """
+    Декоратор ограничивающий количество одновременных активных задач.
+    Если передан key(*args, **kwargs), ограничение действует отдельно для каждого ключа (например, хоста).
+    Семафоры создаются отдельно для каждого цикла событий.
+    """
+    semaphores = weakref.WeakKeyDictionary()
+
+    def get_semaphore(args, kwargs):
+        loop_semaphores = semaphores.setdefault(asyncio.get_running_loop(), {})
+        k = key(*args, **kwargs) if key else None
+        if k not in loop_semaphores:
+            loop_semaphores[k] = asyncio.Semaphore(value=n)
+        return loop_semaphores[k]
 
     def executor(func):
         @wraps(func)
         async def wrapper(*args, **kwargs):
-            async with sem:
+            async with get_semaphore(args, kwargs):
                 return await func(*args, **kwargs)
 
         return wrapper
@@ -185,6 +578,9 @@ def concurrency_limit(n=3):
 class AsyncWeb(AsyncBase, ABC):
     """Абстрактный класс, реализующий стандартные настройки для работы с сетью"""
 
+    _runtime_attributes = AsyncBase._runtime_attributes + ('_host_limiter', '_slots', '_adaptive', '_session',
+                                                           '_session_loop', '_limits_loop')
+
     def __init__(
             self,
             connections_limit=20,
@@ -201,6 +597,23 @@ class AsyncWeb(AsyncBase, ABC):
         self._headers = {}
         self.cookies = {}
 
+        self._host_settings = {}
+        self._host_lookahead = None
+        self._host_limiter = None
+        self._slots = None
+        self._adaptive_settings = None
+        self._adaptive = None
+        self.dns_cache = None
+
+        self._session = None
+        self._session_loop = None
+        self._limits_loop = None
+
+    def _finish_run(self):
+        super()._finish_run()
+        if self.dns_cache is not None:
+            self.dns_cache.finish_run()
+
     @property
     def headers(self):
         return {"User-Agent": self.user_agent} | self._headers
@@ -222,3 +635,213 @@ class AsyncWeb(AsyncBase, ABC):
 
         self.user_agent = user_agent
         return self
+
+    def host_settings(self, limit_per_host=0, rate_per_host: float | None = None, burst=1,
+                      hosts: dict | None = None, lookahead: int | None = None):
+        """
+        Per host limits of concurrent requests and requests per second (token bucket keyed by netloc).
+        hosts - settings of specific hosts: {'example.com': {'limit': 2, 'rate': 0.5, 'burst': 1}}.
+        lookahead - number of additional tasks waiting for slots of busy hosts
+        (connections_limit * 4 by default), so other hosts are not blocked by them.
+        Tasks are not reordered: if the whole lookahead window belongs to busy hosts, it waits for them.
+        """
+
+        self._host_settings = dict(limit_per_host=limit_per_host, rate_per_host=rate_per_host,
+                                   burst=burst, hosts=hosts)
+        self._host_lookahead = lookahead
+        return self
+
+    def set_adaptive_concurrency(self, enabled=True, min_limit=1, max_limit: int | None = None,
+                                 initial: int | None = None, per_host=False, increase=1.0, decrease=0.5,
+                                 latency_tolerance: float | None = 2.5,
+                                 on_change: Callable[[str | None, int], Any] | None = None):
+        """
+        Adaptive limit of concurrent requests (AIMD) within connections_limit (and limit_per_host).
+        Limit grows by increase per limit of successful requests and is multiplied by decrease
+        on timeouts, connection errors, 408/429/502/503/504 answers or latency above baseline * latency_tolerance.
+        Latency is time to response headers after waiting for free slots (time of page load in browsers).
+        If per_host is True, every host has own limit.
+        on_change(host, limit) is called on every change, all changes are kept in concurrency_history.
+        """
+
+        self._adaptive_settings = dict(min_limit=min_limit, max_limit=max_limit, initial=initial, per_host=per_host,
+                                       increase=increase, decrease=decrease, latency_tolerance=latency_tolerance,
+                                       on_change=on_change) if enabled else None
+        return self
+
+    def set_dns_cache(self, dns_cache: DnsCache | bool | None = True, ttl: float = 300, max_size: int | None = 10000,
+                      resolver: str | AbstractResolver = 'threaded', prefetch=0, path: str | None = None,
+                      hosts: dict[str, str | list[str]] | None = None):
+        """
+        DNS cache shared by sessions of all runs instead of cache of connector.
+        Addresses are kept for ttl seconds, at most max_size hosts are kept.
+        resolver - 'threaded', 'async' (aiodns is required) or AbstractResolver instance (for example stub for tests).
+        prefetch - number of urls ahead of started tasks, hosts of which are resolved in background.
+        If path is set, cache is loaded from JSON file and is saved at the end of every run.
+        hosts - static addresses of hosts: {'example.com': '127.0.0.1'}.
+        Statistics of cache are available in self.dns_cache.stats.
+        """
+
+        if dns_cache is True:
+            dns_cache = DnsCache(ttl, max_size, resolver, prefetch=prefetch, path=path, hosts=hosts)
+        self.dns_cache = dns_cache or None
+        return self
+
+    def _prefetch_hosts(self, items):
+        """Источник элементов с фоновым разрешением хостов следующих url"""
+
+        if self.dns_cache is None or not self.dns_cache.prefetch or isinstance(items, str):
+            return items
+        return self.dns_cache.prefetch_items(items, lambda item: item.get('url') if isinstance(item, dict) else item)
+
+    @property
+    def concurrency_history(self) -> list[tuple[float, str | None, int]]:
+        """Changes of adaptive limit of last run: (time, host or None, limit)"""
+        return self._adaptive.history if self._adaptive is not None else []
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.aclose()
+
+    async def open(self):
+        """
+        Long-lived mode: one session (connection pool, DNS cache, cookies) and per host state
+        (host limits, adaptive limits) are kept between runs until aclose().
+        Can be used as async context manager: async with AsyncRequests() as r: ...
+        Runs in other event loops (sync run()) use own sessions.
+        Runs of one instance must not overlap (RuntimeError is raised), use one instance per concurrent run.
+        Changed limits settings are applied after aclose().
+        """
+
+        if self._session is None or self._session.closed:
+            self._session = self._create_session()
+            self._session_loop = asyncio.get_running_loop()
+            self._limits_loop = None
+        return self
+
+    async def aclose(self):
+        """Closing of long-lived session"""
+
+        session, self._session = self._session, None
+        self._session_loop = None
+        self._limits_loop = None
+        if session is not None and not session.closed:
+            await session.close()
+        if self.dns_cache is not None:
+            await self.dns_cache.close()
+
+    def _is_long_lived(self) -> bool:
+        """Открыта ли постоянная сессия в текущем цикле событий"""
+
+        if self._session is None or self._session.closed:
+            return False
+        try:
+            return self._session_loop is asyncio.get_running_loop()
+        except RuntimeError:
+            return False
+
+    @asynccontextmanager
+    async def _session_context(self):
+        """Постоянная сессия в долгоживущем режиме, иначе новая сессия на время запуска"""
+
+        if self._is_long_lived():
+            self._session.headers.update(self.headers)
+            yield self._session
+            return
+
+        try:
+            async with self._create_session() as session:
+                yield session
+        finally:
+            if self.dns_cache is not None:
+                await self.dns_cache.close()
+
+    def _init_limits(self):
+        """Создание лимитов на время запуска (один раз для постоянной сессии)"""
+
+        if self._is_long_lived():
+            if self._limits_loop is self._session_loop:
+                return
+            self._limits_loop = self._session_loop
+
+        self._host_limiter = HostLimiter(**self._host_settings)
+        self._adaptive = None
+        if self._adaptive_settings is not None:
+            settings = dict(self._adaptive_settings)
+            max_limit = settings.pop('max_limit') or self.connections_limit
+            if settings['per_host'] and self._host_limiter.limit_per_host:
+                max_limit = min(max_limit, self._host_limiter.limit_per_host)
+            self._adaptive = AdaptiveConcurrency(min(max_limit, self.connections_limit), **settings)
+
+        if self._host_limiter.enabled or self._adaptive is not None or self._get_retry_policy().release_slot:
+            self._slots = asyncio.Semaphore(self.connections_limit)
+        else:
+            self._slots = None
+
+    @property
+    def _tasks_limit(self):
+        """Количество одновременно запущенных заданий"""
+
+        if self._slots is None:
+            return self.connections_limit
+        if self._host_lookahead is None:
+            return self.connections_limit * 5
+        return self.connections_limit + self._host_lookahead
+
+    def _create_session(self) -> aiohttp.ClientSession:
+        """Сессия запуска с настройками соединений, заголовками, cookie и трассировкой для метрик"""
+
+        dns_settings = {} if self.dns_cache is None else dict(resolver=self.dns_cache, use_dns_cache=False)
+        connector = aiohttp.TCPConnector(limit=self.connections_limit,
+                                         force_close=not self.keep_alive,
+                                         keepalive_timeout=self.keep_alive_timeout,
+                                         **dns_settings)
+        trace_configs = [self.metrics.trace_config()] if self.metrics is not None else None
+        session = aiohttp.ClientSession(connector=connector, trace_configs=trace_configs)
+        session.headers.update(self.headers)
+        session.cookie_jar.update_cookies(self.cookies)
+        return session
+
+    @asynccontextmanager
+    async def _trace(self, url):
+        """
+        Трассировка запроса для метрик.
+        Возвращает RequestTrace, который передается в запрос как trace_request_ctx, или None
+        """
+
+        if self.metrics is None:
+            yield None
+            return
+
+        trace = self.metrics.start_request(url)
+        try:
+            yield trace
+        except BaseException as e:
+            self.metrics.finish_request(trace, e)
+            raise
+        self.metrics.finish_request(trace)
+
+    @asynccontextmanager
+    async def _limits(self, url):
+        """
+        Ожидание свободного слота хоста и общего слота.
+        При адаптивном лимите возвращает AdaptiveRequest, время запроса отсчитывается после получения
+        общего слота, и у него нужно вызвать headers_received() после получения заголовков ответа
+        """
+
+        if self._slots is None:
+            yield None
+            return
+
+        async with self._host_limiter.limit(url):
+            if self._adaptive is None:
+                async with self._slots:
+                    yield None
+                return
+
+            async with self._adaptive.limit(url) as request, self._slots:
+                request.begin()
+                yield request
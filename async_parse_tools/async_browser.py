@@ -2,9 +2,11 @@ import asyncio
 from enum import Enum
 
 from .async_base import AsyncWeb
+from .block_rules import BlockRules
+from .page_pool import PagePool
 from typing import Awaitable, Any, Callable
 
-from playwright.async_api import async_playwright, Page, BrowserContext, Browser, Route
+from playwright.async_api import async_playwright, Page, BrowserContext, Browser
 
 
 class BrowserType(Enum):
@@ -14,6 +16,9 @@ class BrowserType(Enum):
 
 
 class AsyncBrowser(AsyncWeb):
+    _runtime_attributes = AsyncWeb._runtime_attributes + ('_browsers',)
+    BROWSER_CRASHES_PER_URL = 2
+
     def __init__(self, connections_limit=20):
         super().__init__(connections_limit)
         self.func = None
@@ -21,6 +26,52 @@ class AsyncBrowser(AsyncWeb):
         self.browser_headless = True
         self.browser_type = BrowserType.CHROMIUM
         self.browser_disable_images = True
+        self.block_rules = None
+
+        self.page_max_uses = 1
+        self.browsers_count = 1
+        self.browser_max_restarts = 5
+        self._browsers = []
+
+    def set_page_pool(self, max_uses: int | None = 100):
+        """
+        Reuse of pages between urls (by default new page is created for every url).
+        Pool of connections_limit pages is kept, page is recycled after max_uses urls or crash.
+        Between urls page is reset: 'about:blank' is opened, routes of page are removed and viewport is restored.
+        Event listeners, exposed functions, init scripts, extra HTTP headers and emulation set by func
+        on page are kept, so func must not leave them or must undo them.
+        max_uses=1 creates new page for every url, None - unlimited reuse.
+        """
+        self.page_max_uses = max_uses
+        return self
+
+    def set_browsers(self, count=1, max_restarts=5):
+        """
+        Number of browser instances, urls are spread between them.
+        Crashed browser is restarted (not more than max_restarts times) and its urls are processed again.
+        To run browsers in separate processes use run_sharded(urls, func, processes=N).
+        """
+        if count < 1:
+            raise ValueError('count must be positive')
+        self.browsers_count = count
+        self.browser_max_restarts = max_restarts
+        return self
+
+    def set_block_rules(self, block_rules: BlockRules | None):
+        """
+        Rules of blocking requests by resource type, url pattern or domain, for example:
+        BlockRules(resource_types=('image', 'media', 'font'), block_trackers=True)
+        Replaces disable_images setting.
+        """
+        self.block_rules = block_rules
+        return self
+
+    def _get_block_rules(self) -> BlockRules | None:
+        if self.block_rules is not None:
+            return self.block_rules
+        if self.browser_disable_images:
+            return BlockRules(resource_types=('image',))
+        return None
 
     def set_browser_settings(self, browser_type=BrowserType.CHROMIUM, headless=True, disable_images=True):
         self.browser_headless = headless
@@ -32,49 +83,120 @@ class AsyncBrowser(AsyncWeb):
         return asyncio.run(self.run_async(urls, func))
 
     async def run_async(self, urls, func: Callable[[str, Page], Awaitable[Any]]):
+        """urls can be a list, a sync or an async iterator of url strings or dicts {'url': str}"""
+        out = await self._collect(self._iter_run(urls, func))
+        self._print_errors()
+        return out
+
+    async def _iter_run(self, urls, func: Callable[[str, Page], Awaitable[Any]], ordered=True):
         self.func = func
+        self._init_limits()
         async with async_playwright() as p:
-            browser, context = await self._start_browser(p)
-
-            tasks = []
-            for url in urls:
-                tasks.append(self._open_page(context, url))
-
-            out = await self._start_tasks_limited(tasks, limit=self.connections_limit)
-            self._print_errors()
+            pool_size = -(-self.connections_limit // self.browsers_count)
+            self._browsers = [BrowserInstance(self, p, pool_size) for _ in range(self.browsers_count)]
+            try:
+                await asyncio.gather(*(b.start() for b in self._browsers))
+
+                tasks = self._map_items(urls, lambda index, item: self._journaled(
+                    self._get_item_key(item), lambda: self._open_page(self._get_url(item))))
+                async for x in self._iter_tasks_limited(tasks, limit=self._tasks_limit,
+                                                        length=self._get_length(urls), ordered=ordered):
+                    yield x
+            finally:
+                await asyncio.gather(*(b.close() for b in self._browsers), return_exceptions=True)
+                self._browsers = []
+
+    def _get_browser(self) -> 'BrowserInstance':
+        """Browser with the most free pages"""
+        return max(self._browsers, key=lambda b: b.pool.available)
+
+    async def _start_browser(self, p) -> tuple[Browser, BrowserContext, Callable[[Page], Awaitable] | None]:
+        """Returns browser, context and function of setting up new pages"""
 
-            await browser.close()
-            return out
-
-    async def _start_browser(self, p) -> tuple[Browser, BrowserContext]:
         browser: Browser = await getattr(p, self.browser_type.value).launch(headless=self.browser_headless)
         context = await browser.new_context(user_agent=self.headers.get('User-Agent'))
+        await context.set_extra_http_headers(self.headers)
+
+        setup_page = None
+        block_rules = self._get_block_rules()
+        if block_rules:
+            setup_page = await block_rules.apply(context, native_available=self.browser_type == BrowserType.CHROMIUM)
+
         if self.cookies:
             await context.add_cookies(cookies=self.cookies)
-        return browser, context
+        return browser, context, setup_page
 
-    async def _open_page(self, context: BrowserContext, url: str):
-        page = await self._create_new_page(context)
+    @staticmethod
+    def _get_url(item) -> str:
+        url = item.get('url') if isinstance(item, dict) else item
+        return str(url).strip() if url else url
+
+    async def _open_page(self, url: str):
 
         @self.try_decorator(url)
         async def get_info():
-            await page.goto(url)
-            return await self.func(url, page)
-
-        out = await get_info()
-
-        await page.close()
-        return out
-
-    async def _create_new_page(self, context: BrowserContext) -> Page:
-        page = await context.new_page()
-        await page.set_extra_http_headers(self.headers)
-        if self.browser_disable_images:
-            await page.route("**/*", self._hide_images)
-        return page
-
-    @staticmethod
-    def _hide_images(route: Route):
-        if route.request.resource_type == "image":
-            return route.abort()
-        return route.continue_()
+            crashes = 0
+            while True:
+                browser = self._get_browser()
+                generation = browser.generation
+                try:
+                    async with browser.pool.page() as page:
+                        async with self._limits(url), self._timing('page_load'):
+                            await page.goto(url)
+                        with self._timing('callback'):
+                            return await self._track(url, self.func(url, page), self.func)
+                except Exception:
+                    if browser.generation == generation and browser.is_connected():
+                        raise
+                    # Browser crashed, url is processed again in restarted browser,
+                    # unless this url crashes browsers every time
+                    await browser.restart(generation)
+                    crashes += 1
+                    if crashes > self.BROWSER_CRASHES_PER_URL:
+                        raise
+
+        return await get_info()
+
+
+class BrowserInstance:
+    """Browser with context and pool of pages, which can be restarted after crash"""
+
+    def __init__(self, runner: AsyncBrowser, playwright, pool_size: int):
+        self.runner = runner
+        self.playwright = playwright
+        self.pool_size = pool_size
+        self.browser: Browser | None = None
+        self.context: BrowserContext | None = None
+        self.pool: PagePool | None = None
+        self.generation = 0
+        self.restarts = 0
+        self._lock = asyncio.Lock()
+
+    async def start(self):
+        self.browser, self.context, setup_page = await self.runner._start_browser(self.playwright)
+        self.pool = PagePool(self.context, self.pool_size, self.runner.page_max_uses, setup_page)
+
+    def is_connected(self):
+        return self.browser is not None and self.browser.is_connected()
+
+    async def restart(self, generation: int):
+        """Restarting of browser, if it was not restarted after given generation"""
+
+        async with self._lock:
+            if generation != self.generation:
+                return
+            if self.restarts >= self.runner.browser_max_restarts:
+                raise RuntimeError(f'Browser crashed more than {self.runner.browser_max_restarts} times')
+            self.restarts += 1
+            await self.close()
+            await self.start()
+            self.generation += 1
+
+    async def close(self):
+        try:
+            if self.pool:
+                await self.pool.close()
+            if self.browser:
+                await self.browser.close()
+        except Exception:
+            pass
@@ -1,17 +1,23 @@
 import os
 import asyncio
-import glob
+import json
+import re
 
 import aiohttp
 from aiofile import async_open
 
 from .async_base import AsyncWeb
 from .fake_array import FakeStringArray, LengthError
+from .folder_index import FolderIndex
+from .hash_store import HashStore
+from .utils import load_json
 
 
 class AsyncDownloader(AsyncWeb):
     """Async File Downloader"""
 
+    _runtime_attributes = AsyncWeb._runtime_attributes + ('_index',)
+
     def __init__(
             self,
             connections_limit=20,
@@ -23,6 +29,7 @@ class AsyncDownloader(AsyncWeb):
         super().__init__(connections_limit, allow_redirects, keep_alive, keep_alive_timeout)
 
         self._urls = None
+        self._created_folders = {}
         self._download_folder_parent = './download'
         self._download_subfolders = None
         self._remove_empty_folders = True
@@ -37,6 +44,12 @@ class AsyncDownloader(AsyncWeb):
         self._check_subfolders = None
         self._check_any_extension = False
 
+        self._streaming = True
+        self._chunk_size = 64 * 1024
+        self._resume = True
+        self._index = None
+        self.hash_store = None
+
     def set_download_folder(self, folder: str, subfolders: str | list | tuple = None, remove_empty_folders=True):
         """Optional setting to set downloading folder"""
 
@@ -64,148 +77,410 @@ class AsyncDownloader(AsyncWeb):
         self._filenames_keep_extension = keep_extension
         return self
 
+    def set_stream_settings(self, streaming=True, chunk_size=64 * 1024, resume=True):
+        """
+        Optional setting of streaming mode.
+        If streaming is True, response is written by chunks to temporary '.part' file,
+        which is renamed when download is finished. Otherwise whole file is read to memory.
+        If resume is True, '.part' files of failed downloads are kept and continued
+        with Range requests on retry or on the next run.
+        """
+
+        if chunk_size <= 0:
+            raise ValueError('chunk_size must be positive')
+        self._streaming = streaming
+        self._chunk_size = chunk_size
+        self._resume = resume
+        return self
+
+    def set_deduplication(self, hash_store: str | HashStore | None, algorithm='sha256', link='hard',
+                          skip_known_urls=True):
+        """
+        Optional content-addressed mode.
+        Files are hashed while streaming, hashes are kept in SQLite database hash_store.
+        Duplicates of already stored content are replaced with links ('hard' or 'symlink') to stored file.
+        If skip_known_urls is True, urls with known content are linked without downloading.
+        """
+
+        if isinstance(hash_store, str):
+            hash_store = HashStore(hash_store, algorithm, link, skip_known_urls)
+        self.hash_store = hash_store
+        return self
+
+    def _finish_run(self):
+        super()._finish_run()
+        if self.hash_store is not None:
+            self.hash_store.close()
+
     def run(self, urls, folder=None):
         """Sync start of downloading"""
         return asyncio.run(self.run_async(urls, folder))
 
     async def run_async(self, urls, folder):
-        """Async start of downloading"""
-        self._urls = FakeStringArray(urls)
-        if folder:
-            self.set_download_folder(folder)
+        """
+        Async start of downloading.
+        urls can be a list, a sync or an async iterator of url strings or dicts
+        {'url': str, 'filename': str, 'subfolder': str, 'check_subfolder': str},
+        where all keys except 'url' are optional and override settings from parallel lists.
+        """
+        results = await self._collect(self._iter_run(urls, folder))
 
-        self._check_lengths()
-        self._create_download_folders()
+        self._print_errors()
 
-        connector = aiohttp.TCPConnector(limit=self.connections_limit,
-                                         force_close=not self.keep_alive,
-                                         keepalive_timeout=self.keep_alive_timeout)
+        if self._remove_empty_folders:
+            await asyncio.to_thread(self._clear_empty_subfolders)
 
-        async with aiohttp.ClientSession(connector=connector) as session:
-            session.headers.update(self.headers)
-            session.cookie_jar.update_cookies(self.cookies)
+        return results
 
-            tasks = (self._prepare_download(session, ind) for ind in range(len(urls)))
+    async def _iter_run(self, urls, folder, ordered=True):
+        """Generator of (url, filepath) in input order or as completed"""
 
-            results = await self._start_tasks_limited(tasks, length=len(urls))
+        self._urls = urls
+        if folder:
+            self.set_download_folder(folder)
 
-        self._print_errors()
+        self._check_lengths()
+        self._init_limits()
+        self._created_folders = {}
+        self._index = FolderIndex()
 
-        if self._remove_empty_folders:
-            self._clear_empty_subfolders()
+        async with self._session_context() as session:
+            items = self._prefetch_hosts(urls)
+            tasks = self._map_items(items, lambda index, item: self._journaled(
+                self._get_item_key(item), lambda: self._prepare_download(session, index, item),
+                default=(item.get('url') if isinstance(item, dict) else item, None)))
+
+            async for res in self._iter_tasks_limited(tasks, limit=self._tasks_limit,
+                                                      length=self._get_length(urls), ordered=ordered):
+                yield res
+
+    @staticmethod
+    def _is_empty_result(result) -> bool:
+        """(url, None) of failed or skipped download"""
+        return result is None or result[1] is None
 
-        return tuple(zip(urls, results))
+    def run_sharded(self, urls, folder=None, **kwargs):
+        """
+        Sync start of downloading in several processes (see AsyncBase.run_sharded).
+        Returns the same as run: tuple of (url, filepath). Empty folders are not removed in sharded run.
+        """
+        return super().run_sharded(urls, folder, **kwargs)
 
-    async def _prepare_download(self, session, index):
+    def iter_sharded(self, urls, folder=None, **kwargs):
+        if folder:
+            self.set_download_folder(folder)
+        self._urls = urls
+        self._check_lengths()
+        if self._filenames or self._download_subfolders or self._check_subfolders:
+            # Every process gets only part of urls, so settings from parallel lists are merged into items
+            items = self._map_items(urls, self._get_item_settings)
+            urls = list(items) if self._get_length(urls) is not None else items
+        return super().iter_sharded(urls, folder, **kwargs)
+
+    def _get_item_settings(self, index, item) -> dict:
+        """Merging settings of item with settings from parallel lists"""
+
+        settings = dict(item) if isinstance(item, dict) else {'url': item}
+        parallel = (('filename', self._filenames, 'names'),
+                    ('subfolder', self._download_subfolders, 'download subfolders'),
+                    ('check_subfolder', self._check_subfolders, 'check subfolders'))
+
+        for key, values, name in parallel:
+            if settings.get(key) is not None:
+                settings[key] = str(settings[key]).strip()
+                if key != 'filename':
+                    settings[key] = settings[key].rstrip(r'.\/')
+            elif values:
+                try:
+                    settings[key] = values[index]
+                except IndexError:
+                    raise LengthError(f'The length of download links list does not match the length of {name} list.')
+
+        return settings
+
+    async def _prepare_download(self, session, index, item):
         """
         Preparing to download file.
         Definition of path and name of file.
         Checking file existence in folders.
+        Returns tuple(url, filepath)
         """
-        url = self._urls[index]
+        settings = self._get_item_settings(index, item)
+        url = str(settings['url']).strip() if settings['url'] else settings['url']
         if not url:
-            return
+            return settings['url'], None
 
         name = url.split('/')[-1].split('?')[0]
         filename, ext = os.path.splitext(name)
 
-        if self._filenames:
+        if settings.get('filename') is not None:
             if self._filenames_as_prefix:
-                name = self._filenames[index] + self._filenames_separator + filename
+                name = settings['filename'] + self._filenames_separator + filename
             else:
-                name = self._filenames[index]
+                name = settings['filename']
 
             if self._filenames_keep_extension:
                 name += ext
 
         folder = self._download_folder_parent
-        if self._download_subfolders:
-            folder = os.path.join(folder, self._download_subfolders[index])
+        if settings.get('subfolder'):
+            folder = os.path.join(folder, settings['subfolder'])
 
         filepath = os.path.join(folder, name)
         if self.skip_checking:
-            return await self._start_download(session, url, filepath)
+            return settings['url'], await self._download(session, url, filepath)
 
         exists_in_download = await self._check_file_in_folder(folder, name)
         exists_in_check = False
 
         if not exists_in_download and self._check_folder_parent:
             check_folder = self._check_folder_parent
-            if self._check_subfolders:
-                check_folder = os.path.join(check_folder, self._check_subfolders[index])
+            if settings.get('check_subfolder'):
+                check_folder = os.path.join(check_folder, settings['check_subfolder'])
 
             exists_in_check = await self._check_file_in_folder(check_folder, name, self._check_any_extension)
 
         if not any((exists_in_download, exists_in_check)):
-            return await self._start_download(session, url, filepath)
+            return settings['url'], await self._download(session, url, filepath)
+        return settings['url'], None
+
+    async def _download(self, session, url, filepath):
+        """Downloading of file and adding it to index of existing files"""
+
+        result = None
+        if self.hash_store is not None and self.hash_store.skip_known_urls:
+            result = await self._link_known_url(url, filepath)
+        if result is None:
+            result = await self._start_download(session, url, filepath)
+        if result is not None:
+            self._index.add(result)
+        return result
 
     async def _start_download(self, session: aiohttp.ClientSession, url, filepath):
         """Starting of file downloading"""
 
         @self.try_decorator(url)
         async def load_image():
-            async with session.get(url, allow_redirects=self.allow_redirects) as r:
-                if r.status == 200:
+            headers, offset = await asyncio.to_thread(self._get_resume_headers, url, filepath)
+            async with self._limits(url) as timing, self._trace(url) as trace, session.get(
+                    url, allow_redirects=self.allow_redirects, headers=headers, trace_request_ctx=trace) as r:
+                if timing is not None:
+                    # Time of streaming of body depends on its size, not on load of server
+                    timing.headers_received()
+                if r.status == 416 and offset:
+                    if self._is_part_complete(r, offset):
+                        hasher = await self._create_hasher(filepath + '.part')
+                        await asyncio.to_thread(self._finish_part, filepath)
+                        return await self._store_hash(url, filepath, hasher)
+                    await asyncio.to_thread(self._remove_part, filepath)
+                    r.raise_for_status()
+
+                if r.status in (200, 206):
+                    await self._create_folder(os.path.dirname(filepath))
+
+                if r.status == 206 and offset and self._get_range_start(r) == offset:
+                    hasher = await self._create_hasher(filepath + '.part')
+                    size = await self._stream_file(filepath, r, offset, hasher)
+                elif r.status == 200 and self._streaming:
+                    if self._resume:
+                        await asyncio.to_thread(self._save_resume_info, url, filepath, r.headers)
+                    hasher = await self._create_hasher()
+                    size = await self._stream_file(filepath, r, hasher=hasher)
+                elif r.status == 200:
                     data = await r.read()
-                    if len(data) > 0:
+                    size = len(data)
+                    hasher = await self._create_hasher()
+                    if hasher is not None:
+                        hasher.update(data)
+                    if size > 0:
                         await self._save_file(filepath, data)
-                        return filepath
-                    else:
-                        self._add_error_info("File size is too low:" + str(len(data)), url)
-                        return None
                 else:
                     r.raise_for_status()
+                    await asyncio.to_thread(self._remove_part, filepath)
+                    raise aiohttp.ClientPayloadError(f'Unexpected response status: {r.status}')
+
+                if trace is not None:
+                    trace.bytes_in = size - offset if r.status == 206 else size
+                if size > 0:
+                    return await self._store_hash(url, filepath, hasher)
+                else:
+                    self._add_error_info("File size is too low:" + str(size), url)
+                    return None
 
         return await load_image()
 
+    async def _link_known_url(self, url, filepath):
+        """Linking of file to stored content of url without downloading, None if content is unknown"""
+
+        blob = await asyncio.to_thread(self.hash_store.get_url_blob, url)
+        if blob is None:
+            return None
+        if os.path.abspath(blob) != os.path.abspath(filepath):
+            await self._create_folder(os.path.dirname(filepath))
+            try:
+                await asyncio.to_thread(self.hash_store.link_to, blob, filepath)
+            except OSError:
+                return None
+        return filepath
+
+    async def _create_hasher(self, part_path=None):
+        """Hasher of content for deduplication, updated with already downloaded part"""
+
+        if self.hash_store is None:
+            return None
+        hasher = self.hash_store.new_hasher()
+        if part_path is not None:
+            await asyncio.to_thread(self.hash_store.hash_file, part_path, hasher)
+        return hasher
+
+    async def _store_hash(self, url, filepath, hasher):
+        """Registration of downloaded file, duplicate is replaced with link to stored file"""
+
+        if hasher is None:
+            return filepath
+        return await asyncio.to_thread(self.hash_store.add, url, filepath, hasher.hexdigest())
+
     def _check_lengths(self):
         """Checking list lengths"""
 
         base_str = ('The length of download links list does not match the length of {} list.\n'
                     'Allowed to use [str | list[str] | tuple[str]]')
 
-        if self._filenames and not self._urls.compare_length(self._filenames):
+        length = self._get_length(self._urls)
+        if length is None:
+            return
+
+        if self._filenames and self._filenames.many and len(self._filenames) != length:
             raise LengthError(
                 base_str.format('names')
             )
-        if self._download_subfolders and not self._urls.compare_length(self._download_subfolders):
+        if self._download_subfolders and self._download_subfolders.many and len(self._download_subfolders) != length:
             raise LengthError(
                 base_str.format('download subfolders')
             )
-        if self._check_subfolders and not self._urls.compare_length(self._check_subfolders):
+        if self._check_subfolders and self._check_subfolders.many and len(self._check_subfolders) != length:
             raise LengthError(
                 base_str.format('check subfolders')
             )
 
-    def _create_download_folders(self):
-        parent_folder = self._download_folder_parent
-        if not os.path.exists(parent_folder):
-            os.makedirs(parent_folder)
+    async def _create_folder(self, folder):
+        """Creating folder in thread pool on first write to it, once per run"""
 
-        if self._download_subfolders:
-            for f in set(self._download_subfolders):
-                folder = os.path.join(parent_folder, f)
-                if not os.path.exists(folder):
-                    os.makedirs(folder)
+        if folder not in self._created_folders:
+            self._created_folders[folder] = asyncio.ensure_future(
+                asyncio.to_thread(os.makedirs, folder or '.', exist_ok=True))
+        await asyncio.shield(self._created_folders[folder])
 
     def _clear_empty_subfolders(self):
+        """Removing of empty folders, touched during run"""
+
         parent_folder = self._download_folder_parent
-        if self._download_subfolders:
-            for f in set(self._download_subfolders):
-                folder = os.path.join(parent_folder, f)
-                if os.path.exists(folder) and not os.listdir(folder.strip()):
-                    os.rmdir(folder)
+        for folder in sorted(set(self._created_folders) - {parent_folder}, key=len, reverse=True):
+            if os.path.exists(folder) and not os.listdir(folder.strip()):
+                os.rmdir(folder)
         if os.path.exists(parent_folder) and not os.listdir(parent_folder.strip()):
             os.rmdir(parent_folder)
             return
 
+    async def _check_file_in_folder(self, folder, name, any_ext=False):
+        """Checking file existence by index, every folder is scanned once per run"""
+
+        return await self._index.contains(folder, name, any_ext)
+
+    async def _stream_file(self, filepath, response: aiohttp.ClientResponse, offset=0, hasher=None):
+        """
+        Writing response body by chunks to '.part' file and moving it to filepath.
+        If offset is set, body is appended to existing '.part' file.
+        If hasher is set, it is updated with written chunks.
+        """
+
+        part_path = filepath + '.part'
+        size = offset
+        try:
+            async with async_open(part_path, 'ab' if offset else 'wb') as f:
+                async for chunk in response.content.iter_chunked(self._chunk_size):
+                    await f.write(chunk)
+                    size += len(chunk)
+                    if hasher is not None:
+                        hasher.update(chunk)
+        except BaseException:
+            if not self._resume:
+                await asyncio.to_thread(self._remove_part, filepath)
+            raise
+
+        await asyncio.to_thread(self._finish_part if size > 0 else self._remove_part, filepath)
+        return size
+
+    def _get_resume_headers(self, url, filepath) -> tuple[dict, int]:
+        """
+        Building Range/If-Range headers for continuing download of existing '.part' file.
+        Download is continued only if validator (strong ETag or Last-Modified) of partial file is known.
+        """
+
+        if not (self._streaming and self._resume):
+            return {}, 0
+
+        part_path = filepath + '.part'
+        try:
+            info = load_json(part_path + '.json')
+        except (ValueError, OSError):
+            # Information is empty or truncated by crash, download is started again
+            info = None
+        if not isinstance(info, dict) or info.get('url') != url or not os.path.exists(part_path):
+            return {}, 0
+
+        offset = os.path.getsize(part_path)
+        validator = info.get('validator')
+        if not offset or not validator:
+            return {}, 0
+
+        return {'Range': f'bytes={offset}-', 'If-Range': validator, 'Accept-Encoding': 'identity'}, offset
+
+    def _save_resume_info(self, url, filepath, headers):
+        """Saving validator of downloading file to '.part.json' to continue download later"""
+
+        info_path = filepath + '.part.json'
+        etag = headers.get('ETag')
+        validator = etag if etag and not etag.startswith('W/') else headers.get('Last-Modified')
+        if not validator or headers.get('Content-Encoding', 'identity') != 'identity':
+            self._remove_file(info_path)
+            return
+
+        # Atomic writing, so crash does not leave truncated file
+        tmp_path = info_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'url': url, 'validator': validator}, f)
+        os.replace(tmp_path, info_path)
+
     @staticmethod
-    async def _check_file_in_folder(folder, name, any_ext=False):
-        filepath = os.path.join(folder, name)
-        if any_ext:
-            return os.path.exists(filepath) or bool(glob.glob(glob.escape(os.path.splitext(filepath)[0]) + '.*'))
+    def _get_range_start(response: aiohttp.ClientResponse):
+        """Returns first byte position from Content-Range header"""
+
+        match = re.match(r'bytes\s+(\d+)-', response.headers.get('Content-Range', ''))
+        return int(match.group(1)) if match else None
+
+    @staticmethod
+    def _is_part_complete(response: aiohttp.ClientResponse, offset):
+        """Checking answer to range request beyond file end (416) if '.part' file has full size"""
 
-        return os.path.exists(filepath)
+        match = re.match(r'bytes\s+\*/(\d+)', response.headers.get('Content-Range', ''))
+        return bool(match) and int(match.group(1)) == offset
+
+    def _finish_part(self, filepath):
+        os.replace(filepath + '.part', filepath)
+        self._remove_file(filepath + '.part.json')
+        return filepath
+
+    def _remove_part(self, filepath):
+        self._remove_file(filepath + '.part')
+        self._remove_file(filepath + '.part.json')
+
+    @staticmethod
+    def _remove_file(filepath):
+        try:
+            os.remove(filepath)
+        except FileNotFoundError:
+            pass
 
     @staticmethod
     async def _save_file(filepath, data):
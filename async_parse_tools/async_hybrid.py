@@ -0,0 +1,178 @@
+import asyncio
+import copy
+import inspect
+from typing import Any, Awaitable, Callable
+
+import aiohttp
+from aiohttp import ClientSession
+from playwright.async_api import async_playwright, Page
+from yarl import URL
+
+from .async_browser import AsyncBrowser, BrowserInstance
+from .async_requests import AsyncRequests, CallbackFunction
+
+JS_CHALLENGE_MARKERS = (
+    b'cf-browser-verification', b'challenge-platform', b'cf_chl_opt', b'_incapsula_resource', b'ddos-guard',
+)
+
+NeedsBrowser = Callable[[str, bytes], bool | Awaitable[bool]]
+
+
+def default_needs_browser(url: str, r: bytes) -> bool:
+    """Empty body, page of JS challenge or short page asking to enable JavaScript"""
+
+    if not r.strip():
+        return True
+    head = r[:20000].lower()
+    if any(x in head for x in JS_CHALLENGE_MARKERS):
+        return True
+    return len(r) < 2048 and b'javascript' in head
+
+
+def missing_text(*markers: str | bytes) -> NeedsBrowser:
+    """Predicate: static html does not contain any of markers (for example, id or class of needed element)"""
+
+    encoded = tuple(x.encode() if isinstance(x, str) else x for x in markers)
+
+    def needs_browser(url: str, r: bytes) -> bool:
+        return not r.strip() or not any(x in r for x in encoded)
+
+    return needs_browser
+
+
+class AsyncHybrid(AsyncRequests):
+    """
+    Pages are loaded with aiohttp and passed to callback_function.
+    Only pages, for which needs_browser(url, r) returns True (or answered with escalate_statuses),
+    are opened in browser and passed to browser_function(url, page).
+    Browser is started on first such page with User-Agent and headers of runner,
+    cookies of session (including cookies received during run) are copied to browser before every page.
+    """
+
+    _runtime_attributes = AsyncRequests._runtime_attributes + ('_browser_instance', '_playwright', '_browser_lock')
+
+    def __init__(
+            self,
+            request_method='get',
+            request_kwargs: tuple[dict] | list[dict] | dict | None = None,
+            connections_limit=20,
+            allow_redirects=False,
+            keep_alive=True,
+            keep_alive_timeout: None | float | object = 30
+    ):
+        super().__init__(request_method, request_kwargs, connections_limit, allow_redirects, keep_alive,
+                         keep_alive_timeout)
+        self.browser = AsyncBrowser(connections_limit=5)
+        self.browser_function = None
+        self.needs_browser: NeedsBrowser = default_needs_browser
+        self.escalate_statuses = (403, 503)
+        self.escalated = 0
+
+        self._browser_instance = None
+        self._playwright = None
+        self._browser_lock = None
+
+    def set_browser_fallback(self, browser_function: Callable[[str, Page], Awaitable[Any]],
+                             needs_browser: NeedsBrowser | None = None, browser: AsyncBrowser | None = None,
+                             escalate_statuses: tuple[int, ...] = (403, 503)):
+        """
+        browser_function(url, page) is called for pages, which need rendering.
+        needs_browser(url, r) - sync or async predicate, default_needs_browser by default.
+        browser - AsyncBrowser with settings of browser (connections_limit is number of pages).
+        """
+
+        self.browser_function = browser_function
+        self.needs_browser = needs_browser or default_needs_browser
+        if browser is not None:
+            self.browser = browser
+        self.escalate_statuses = escalate_statuses
+        return self
+
+    async def _iter_run(self, urls, callback_function: CallbackFunction, ordered=True):
+        if self.browser_function is None:
+            raise ValueError('browser_function is not set, use set_browser_fallback()')
+
+        self.escalated = 0
+        self._browser_lock = asyncio.Lock()
+        try:
+            async for res in super()._iter_run(urls, callback_function, ordered=ordered):
+                yield res
+        finally:
+            await self._stop_browser()
+
+    async def _load_info(self, session: ClientSession, url, request_kwargs):
+
+        @self.try_decorator(url)
+        async def parse_info():
+            try:
+                r = await self._fetch(session, url, request_kwargs)
+            except aiohttp.ClientResponseError as e:
+                if e.status not in self.escalate_statuses:
+                    raise
+                r = None
+
+            if r is None or await self._check_needs_browser(url, r):
+                return await self._render(url, session)
+            return await self._call_callback(url, r, session)
+
+        return await parse_info()
+
+    async def _check_needs_browser(self, url, r: bytes) -> bool:
+        result = self.needs_browser(url, r)
+        if inspect.isawaitable(result):
+            result = await result
+        return bool(result)
+
+    async def _render(self, url, session: ClientSession):
+        """Opening of url in pooled browser page"""
+
+        self.escalated += 1
+        browser = await self._get_browser()
+        generation = browser.generation
+        try:
+            await self._copy_cookies(url, session, browser)
+            async with browser.pool.page() as page:
+                async with self._limits(url), self._timing('page_load'):
+                    await page.goto(url)
+                with self._timing('callback'):
+                    return await self._track(url, self.browser_function(url, page), self.browser_function)
+        except Exception:
+            if browser.generation == generation and not browser.is_connected():
+                await browser.restart(generation)
+            raise
+
+    async def _get_browser(self) -> BrowserInstance:
+        async with self._browser_lock:
+            if self._browser_instance is None:
+                self._playwright = await async_playwright().start()
+                instance = BrowserInstance(self._get_browser_settings(), self._playwright,
+                                           self.browser.connections_limit)
+                await instance.start()
+                self._browser_instance = instance
+        return self._browser_instance
+
+    def _get_browser_settings(self) -> AsyncBrowser:
+        """Copy of browser settings with User-Agent and headers of runner"""
+
+        browser = copy.copy(self.browser)
+        browser.set_user_agent(self.user_agent)
+        browser.set_headers(self.browser._headers | self._headers)
+        return browser
+
+    @staticmethod
+    async def _copy_cookies(url, session: ClientSession, browser: BrowserInstance):
+        """Cookies of session, which are sent to url, are added to browser context"""
+
+        url = URL(url)
+        cookies = session.cookie_jar.filter_cookies(url)
+        if cookies:
+            await browser.context.add_cookies([{'name': x.key, 'value': x.value, 'domain': url.host, 'path': '/'}
+                                               for x in cookies.values()])
+
+    async def _stop_browser(self):
+        if self._browser_instance is not None:
+            await self._browser_instance.close()
+            self._browser_instance = None
+        if self._playwright is not None:
+            await self._playwright.stop()
+            self._playwright = None
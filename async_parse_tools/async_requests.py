@@ -1,14 +1,22 @@
 import asyncio
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 from typing import Callable, Any, Awaitable
 
-import aiohttp
 from aiohttp import ClientSession
 
 from .async_base import AsyncWeb
-from .fake_array import FakeArray, FakeStringArray, LengthError
+from .fake_array import FakeArray, LengthError
+from .http_cache import HttpCache
+
+
+CallbackFunction = Callable[[str, bytes, ClientSession], Awaitable[Any]] | Callable[[str, bytes], Any]
 
 
 class AsyncRequests(AsyncWeb):
+    _runtime_attributes = AsyncWeb._runtime_attributes + ('_executor', '_executor_slots', 'urls')
+    _output_type = list
+
     def __init__(
             self,
             request_method='get',
@@ -28,66 +36,195 @@ class AsyncRequests(AsyncWeb):
 
         self.urls = None
         self.callback_function = None
+        self.cache = None
+
+        self.executor = None
+        self.executor_workers = None
+        self.executor_pending = None
+        self._executor = None
+        self._executor_slots = None
+
+    def set_cache(self, cache: str | HttpCache | None, ttl: float | None = None, max_size: int | None = None):
+        """
+        Optional persistent cache of GET responses in SQLite database.
+        Entries younger than ttl seconds are returned without requests,
+        older ones are revalidated with ETag/Last-Modified and 304 answers are replayed from cache.
+        max_size - maximum size of cached bodies in bytes.
+        """
+
+        if isinstance(cache, str):
+            cache = HttpCache(cache, ttl, max_size)
+        self.cache = cache
+        return self
+
+    def set_executor(self, executor: str | Executor | None = 'process', max_workers: int | None = None,
+                     max_pending: int | None = None):
+        """
+        Executor for sync callback functions with signature callback(url: str, r: bytes).
+        executor - 'process', 'thread' or Executor instance. Executors created from strings are closed after run.
+        For 'process' executor callback must be picklable (defined at module level).
+        max_pending - maximum number of callbacks submitted to executor at once (max_workers * 2 by default).
+        Loaded responses waiting for free slots are bounded only by number of running tasks
+        (connections_limit, plus lookahead if host limits are set).
+        Async callbacks (and objects with async __call__) are always awaited on event loop.
+        Without executor callback(url, r, session) is awaited on event loop.
+        """
+
+        if isinstance(executor, str) and executor not in ('process', 'thread'):
+            raise ValueError("executor must be 'process', 'thread' or Executor instance")
+        self.executor = executor
+        self.executor_workers = max_workers
+        self.executor_pending = max_pending
+        return self
+
+    def _start_executor(self):
+        if self.executor == 'process':
+            self._executor = ProcessPoolExecutor(self.executor_workers)
+        elif self.executor == 'thread':
+            self._executor = ThreadPoolExecutor(self.executor_workers)
+        else:
+            self._executor = self.executor
+
+        workers = getattr(self._executor, '_max_workers', None) or os.cpu_count() or 1
+        self._executor_slots = asyncio.Semaphore(self.executor_pending or workers * 2)
+
+    async def _stop_executor(self):
+        """Waiting for workers in thread, so event loop is not blocked"""
+
+        executor, self._executor = self._executor, None
+        if executor is not None and executor is not self.executor:
+            await asyncio.to_thread(executor.shutdown, cancel_futures=True)
+
+    async def _call_callback(self, url, r: bytes, session: ClientSession):
+        """Calling of callback on event loop or of sync callback in executor, if it is set"""
+
+        if self._executor is None or self._is_async_callback(self.callback_function):
+            with self._timing('callback'):
+                return await self._track(url, self.callback_function(url, r, session), self.callback_function)
+
+        async with self._executor_slots:
+            loop = asyncio.get_running_loop()
+            with self._timing('callback'):
+                return await loop.run_in_executor(self._executor, self.callback_function, url, r)
+
+    @staticmethod
+    def _is_async_callback(callback) -> bool:
+        return asyncio.iscoroutinefunction(callback) or asyncio.iscoroutinefunction(getattr(callback, '__call__', None))
 
     def _check_lengths(self):
         base_str = 'The length of requests urls list does not match the length of {} list.'
 
-        if self.request_kwargs and not self.urls.compare_length(self.request_kwargs):
+        length = self._get_length(self.urls)
+        if self.request_kwargs.many and length is not None and length != len(self.request_kwargs):
             raise LengthError(base_str.format('request_kwargs'))
 
-    def run(self, urls, callback_function: Callable[[str, bytes, ClientSession], Awaitable[Any]]):
-        return asyncio.run(self.run_async(urls, callback_function))
+    def _get_item(self, index, item) -> tuple[str, dict]:
+        """
+        Returns url and request kwargs of item.
+        Item is url string or dict {'url': str, 'request_kwargs': dict}.
+        """
 
-    async def run_async(self, urls, callback_function: Callable[[str, bytes, ClientSession], Awaitable[Any]]):
-        self.urls = FakeStringArray(urls)
-        self.callback_function = callback_function
-        self._check_lengths()
+        if isinstance(item, dict):
+            url, kwargs = item.get('url'), item.get('request_kwargs')
+        else:
+            url, kwargs = item, None
 
-        connector = aiohttp.TCPConnector(limit=self.connections_limit,
-                                         force_close=not self.keep_alive,
-                                         keepalive_timeout=self.keep_alive_timeout)
+        if kwargs is None:
+            try:
+                kwargs = self.request_kwargs[index]
+            except IndexError:
+                raise LengthError('The length of requests urls list does not match the length of request_kwargs list.')
 
-        async with aiohttp.ClientSession(connector=connector) as session:
-            session.headers.update(self.headers)
-            session.cookie_jar.update_cookies(self.cookies)
+        return str(url).strip() if url else url, kwargs
 
-            tasks = [self._load_info(session, index) for index in range(len(urls))]
-            output = await self._start_tasks(tasks)
+    def run(self, urls, callback_function: CallbackFunction):
+        return asyncio.run(self.run_async(urls, callback_function))
 
+    async def run_async(self, urls, callback_function: CallbackFunction):
+        """
+        urls can be a list, a sync or an async iterator of url strings
+        or dicts {'url': str, 'request_kwargs': dict}
+        """
+        output = await self._collect(self._iter_run(urls, callback_function))
         self._print_errors()
 
         return output
 
     async def run_async_as_completed(self, urls,
-                                     callback_function: Callable[[str, bytes, ClientSession], Awaitable[Any]]):
-        self.urls = FakeStringArray(urls)
-        self.callback_function = callback_function
-        self._check_lengths()
-
-        connector = aiohttp.TCPConnector(limit=self.connections_limit,
-                                         force_close=not self.keep_alive,
-                                         keepalive_timeout=self.keep_alive_timeout)
-
-        async with aiohttp.ClientSession(connector=connector) as session:
-            session.headers.update(self.headers)
-            session.cookie_jar.update_cookies(self.cookies)
-
-            tasks = [self._load_info(session, index) for index in range(len(urls))]
-            async for res in self._start_tasks_as_completed(tasks):
+                                     callback_function: CallbackFunction):
+        self._reset_run_state()
+        try:
+            async for res in self._iter_run(urls, callback_function, ordered=False):
                 yield res
+        finally:
+            self._finish_run()
 
         self._print_errors()
 
-    async def _load_info(self, session: ClientSession, index):
+    async def _iter_run(self, urls, callback_function: CallbackFunction, ordered=True):
+        """Generator of results of requests in input order or as completed"""
 
-        url = self.urls[index]
+        self.urls = urls
+        self.callback_function = callback_function
+        self._check_lengths()
+        self._init_limits()
+
+        self._start_executor()
+        try:
+            async with self._session_context() as session:
+                items = self._prefetch_hosts(urls)
+                tasks = self._map_items(items, lambda index, item: self._journaled(
+                    self._get_item_key(item), lambda: self._load_info(session, *self._get_item(index, item))))
+                async for res in self._iter_tasks_limited(tasks, limit=self._tasks_limit,
+                                                          length=self._get_length(urls), ordered=ordered):
+                    yield res
+        finally:
+            await self._stop_executor()
+            if self.cache is not None:
+                await asyncio.to_thread(self.cache.finish_run)
+
+    async def _load_info(self, session: ClientSession, url, request_kwargs):
 
         @self.try_decorator(url)
         async def parse_info():
+            r = await self._fetch(session, url, request_kwargs)
+            return await self._call_callback(url, r, session)
+
+        return await parse_info()
+
+    async def _fetch(self, session: ClientSession, url, request_kwargs) -> bytes:
+        """Loading of response body using cache if it is set"""
+
+        cache_key = self._get_cache_key(url, request_kwargs)
+        entry = await self.cache.get_async(cache_key) if cache_key else None
+        if entry and entry.is_fresh(self.cache.ttl):
+            return entry.body
+
+        if entry and entry.conditional_headers:
+            request_kwargs = request_kwargs | {'headers': (request_kwargs.get('headers') or {})
+                                                          | entry.conditional_headers}
+
+        async with self._limits(url) as timing, self._trace(url) as trace:
             async with session.request(self.request_method, url, allow_redirects=self.allow_redirects,
-                                       **self.request_kwargs[index]) as res:
+                                       trace_request_ctx=trace, **request_kwargs) as res:
+                if timing is not None:
+                    timing.headers_received()
+                if entry and res.status == 304:
+                    await self.cache.touch_async(cache_key)
+                    return entry.body
+
                 res.raise_for_status()
                 r = await res.read()
-                return await self.callback_function(url, r, session)
 
-        return await parse_info()
+        etag, last_modified = res.headers.get('ETag'), res.headers.get('Last-Modified')
+        if cache_key and res.status == 200 and (etag or last_modified or self.cache.ttl is not None):
+            await self.cache.set_async(cache_key, url, r, etag, last_modified)
+        return r
+
+    def _get_cache_key(self, url, request_kwargs) -> str | None:
+        """Only GET requests without body are cached"""
+
+        if (self.cache is None or self.request_method.upper() != 'GET'
+                or any(request_kwargs.get(x) is not None for x in ('data', 'json'))):
+            return None
+        return self.cache.make_key(self.request_method, url, request_kwargs.get('params'))
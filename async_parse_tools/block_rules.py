@@ -0,0 +1,100 @@
+import fnmatch
+import re
+from typing import Awaitable, Callable, Iterable, Pattern
+
+from playwright.async_api import BrowserContext, Page, Route
+
+TRACKER_DOMAINS = (
+    'google-analytics.com', 'googletagmanager.com', 'doubleclick.net', 'googlesyndication.com',
+    'googleadservices.com', 'adservice.google.com', 'connect.facebook.net', 'mc.yandex.ru', 'an.yandex.ru',
+    'hotjar.com', 'clarity.ms', 'scorecardresearch.com', 'amazon-adsystem.com', 'criteo.com', 'criteo.net',
+    'taboola.com', 'outbrain.com', 'segment.io', 'mixpanel.com', 'nr-data.net', 'adnxs.com', 'quantserve.com',
+    'analytics.tiktok.com', 'top-fwz1.mail.ru', 'vk.com/rtrg',
+)
+
+
+class BlockRules:
+    """
+    Rules of blocking browser requests, compiled once per run.
+    resource_types - Playwright resource types: image, media, font, stylesheet, script, xhr, ...
+    url_patterns - globs (* matches any characters) or compiled regular expressions of urls.
+    domains - domains, blocked with all subdomains.
+    If block_trackers is True, TRACKER_DOMAINS are added to domains.
+    If native is True, url and domain rules in Chromium are applied by browser itself (CDP),
+    without Python callbacks for every request.
+    """
+
+    def __init__(self, resource_types: Iterable[str] = (), url_patterns: Iterable[str | Pattern] = (),
+                 domains: Iterable[str] = (), block_trackers=False, native=True):
+        self.resource_types = frozenset(resource_types)
+        self.url_patterns = tuple(url_patterns)
+        self.domains = tuple(d.lower().strip().lstrip('.') for d in domains)
+        if block_trackers:
+            self.domains += TRACKER_DOMAINS
+        self.native = native
+        self.url_regex = self._compile()
+
+    def _compile(self) -> Pattern | None:
+        parts = []
+        for pattern in self.url_patterns:
+            if isinstance(pattern, str):
+                parts.append('^' + fnmatch.translate(pattern))
+            else:
+                parts.append(pattern.pattern)
+        if self.domains:
+            domains = '|'.join(re.escape(d) for d in self.domains)
+            parts.append(rf'^[a-z][a-z0-9+.-]*://(?:[^/?#]*\.)?(?:{domains})(?:[:/?#]|$)')
+        if not parts:
+            return None
+        return re.compile('|'.join(f'(?:{x})' for x in parts), re.IGNORECASE)
+
+    @property
+    def native_patterns(self) -> list[str] | None:
+        """Wildcard patterns for Network.setBlockedURLs, None if some rules can not be converted"""
+
+        if any(not isinstance(x, str) for x in self.url_patterns):
+            return None
+        patterns = list(self.url_patterns)
+        for domain in self.domains:
+            host, _, path = domain.partition('/')
+            patterns += [f'*://{host}/{path}*', f'*://*.{host}/{path}*']
+        return patterns
+
+    def matches(self, url: str, resource_type: str | None = None) -> bool:
+        if resource_type in self.resource_types:
+            return True
+        return bool(self.url_regex and self.url_regex.search(url))
+
+    async def _route_all(self, route: Route):
+        request = route.request
+        if self.matches(request.url, request.resource_type):
+            await route.abort()
+        else:
+            await route.continue_()
+
+    @staticmethod
+    async def _abort(route: Route):
+        await route.abort()
+
+    async def apply(self, context: BrowserContext, native_available=False) -> Callable[[Page], Awaitable] | None:
+        """
+        Applying rules to context.
+        Returns function, which should be called for every new page, if native blocking is used.
+        """
+
+        patterns = self.native_patterns if self.native and native_available else None
+        if self.resource_types:
+            await context.route('**/*', self._route_all)
+        elif self.url_regex and not patterns:
+            # Only matched requests are passed to Python
+            await context.route(self.url_regex, self._abort)
+
+        if not patterns:
+            return None
+
+        async def block_native(page: Page):
+            session = await context.new_cdp_session(page)
+            await session.send('Network.enable')
+            await session.send('Network.setBlockedURLs', {'urls': patterns})
+
+        return block_native
@@ -0,0 +1,281 @@
+import asyncio
+import ipaddress
+import json
+import os
+import socket
+import time
+from collections import OrderedDict, deque
+from collections.abc import AsyncIterable
+from urllib.parse import urlparse
+
+from aiohttp.abc import AbstractResolver
+from aiohttp.resolver import AsyncResolver, ThreadedResolver
+
+
+def _is_ip(host: str) -> bool:
+    try:
+        ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return True
+
+
+def _get_hostname(url) -> str | None:
+    url = str(url)
+    return urlparse(url).hostname if '://' in url else url.lower() or None
+
+
+class _Entry:
+    __slots__ = ('addresses', 'expires', 'error')
+
+    def __init__(self, addresses: list[dict] | None, expires: float, error: str | None = None):
+        self.addresses = addresses
+        self.expires = expires
+        self.error = error
+
+
+class DnsCache(AbstractResolver):
+    """
+    Caching DNS resolver for TCPConnector, which is shared between sessions and runs.
+    Addresses are kept for ttl seconds (addresses from resolver with 'ttl' key are kept not longer than it),
+    failed lookups - for negative_ttl seconds. At most max_size hosts are kept, least recently used are dropped.
+    Concurrent lookups of one host are merged into one.
+    resolver - 'threaded' (getaddrinfo in thread pool), 'async' (aiodns is required)
+    or AbstractResolver instance, for example stub resolver for tests.
+    hosts - static addresses of hosts: {'example.com': '127.0.0.1'}.
+    prefetch - number of urls ahead of started tasks, hosts of which are resolved in background.
+    If path is set, cache is loaded from JSON file and is saved to it at the end of every run.
+    """
+
+    def __init__(self, ttl: float = 300, max_size: int | None = 10000, resolver: str | AbstractResolver = 'threaded',
+                 negative_ttl: float = 30, hosts: dict[str, str | list[str]] | None = None, prefetch=0,
+                 path: str | None = None):
+        if isinstance(resolver, str) and resolver not in ('threaded', 'async'):
+            raise ValueError("resolver must be 'threaded', 'async' or AbstractResolver instance")
+        self.ttl = ttl
+        self.max_size = max_size
+        self.resolver = resolver
+        self.negative_ttl = negative_ttl
+        self.hosts = {k.lower(): [v] if isinstance(v, str) else list(v) for k, v in (hosts or {}).items()}
+        self.prefetch = prefetch
+        self.path = path
+
+        self._entries: OrderedDict[tuple[str, int], _Entry] = OrderedDict()
+        self._pending: dict[tuple[str, int], asyncio.Future] = {}
+        self._loop = None
+        self._resolver = None
+        self.reset_stats()
+
+        if path and os.path.exists(path):
+            self.load(path)
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.lookups = 0
+        self.failures = 0
+        self.prefetched = 0
+
+    @property
+    def stats(self) -> dict:
+        return {'size': len(self._entries), 'hits': self.hits, 'misses': self.misses, 'lookups': self.lookups,
+                'failures': self.failures, 'prefetched': self.prefetched}
+
+    def _check_loop(self):
+        """Lookups and resolver created from string belong to one event loop"""
+
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._pending = {}
+            self._resolver = None
+
+    def _get_resolver(self) -> AbstractResolver:
+        if not isinstance(self.resolver, str):
+            return self.resolver
+        if self._resolver is None:
+            self._resolver = AsyncResolver() if self.resolver == 'async' else ThreadedResolver()
+        return self._resolver
+
+    async def resolve(self, host: str, port: int = 0, family: socket.AddressFamily = socket.AF_INET) -> list[dict]:
+        if host.lower() in self.hosts:
+            return self._static_addresses(host, port)
+
+        key = (host, int(family))
+        entry = self._get_entry(key)
+        if entry is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+            self._check_loop()
+            entry = await asyncio.shield(self._lookup(key))
+
+        if entry.addresses is None:
+            raise OSError(None, f'DNS lookup failed: {entry.error}')
+        return [dict(x, hostname=host, port=port) for x in entry.addresses]
+
+    def _static_addresses(self, host, port) -> list[dict]:
+        return [{'hostname': host, 'host': address, 'port': port,
+                 'family': socket.AF_INET6 if ':' in address else socket.AF_INET,
+                 'proto': 0, 'flags': socket.AI_NUMERICHOST | socket.AI_NUMERICSERV}
+                for address in self.hosts[host.lower()]]
+
+    def _get_entry(self, key) -> _Entry | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires <= time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _set_entry(self, key, entry: _Entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while self.max_size is not None and len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def _lookup(self, key) -> asyncio.Future:
+        """Lookup of host, which is shared by all waiting requests"""
+
+        future = self._pending.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._resolve(*key))
+            self._pending[key] = future
+            future.add_done_callback(lambda x: self._lookup_done(key, x))
+        return future
+
+    def _lookup_done(self, key, future: asyncio.Future):
+        self._pending.pop(key, None)
+        if not future.cancelled():
+            # Errors of background lookups are raised in requests
+            future.exception()
+
+    async def _resolve(self, host, family) -> _Entry:
+        self.lookups += 1
+        try:
+            addresses = await self._get_resolver().resolve(host, 0, family)
+        except OSError as e:
+            self.failures += 1
+            entry = _Entry(None, time.time() + self.negative_ttl, str(e) or e.__class__.__name__)
+        else:
+            ttl = min([self.ttl] + [x['ttl'] for x in addresses if x.get('ttl') is not None])
+            entry = _Entry([{k: v for k, v in x.items() if k != 'ttl'} for x in addresses], time.time() + ttl)
+
+        if entry.addresses is not None or self.negative_ttl:
+            self._set_entry((host, family), entry)
+        return entry
+
+    def prefetch_url(self, url):
+        """Resolving of host of url in background, if it is not cached"""
+
+        host = _get_hostname(url)
+        if not host or _is_ip(host) or host in self.hosts:
+            return
+        self._check_loop()
+        key = (host, int(socket.AF_UNSPEC))
+        if key in self._pending or self._get_entry(key) is not None:
+            return
+        self.prefetched += 1
+        self._lookup(key)
+
+    def prefetch_items(self, items, get_url=lambda x: x):
+        """
+        Iterator (sync or async as items) over items, which resolves hosts of next prefetch items in background.
+        get_url(item) returns url of item.
+        """
+
+        if isinstance(items, AsyncIterable):
+            return self._prefetch_async(items, get_url)
+
+        def prefetch_sync():
+            buffer = deque()
+            for item in items:
+                buffer.append(item)
+                self.prefetch_url(get_url(item))
+                if len(buffer) > self.prefetch:
+                    yield buffer.popleft()
+            while buffer:
+                yield buffer.popleft()
+
+        return prefetch_sync()
+
+    async def _prefetch_async(self, items: AsyncIterable, get_url):
+        """
+        Items are read ahead by background task into queue of prefetch items,
+        so every item is passed on as soon as it is received
+        """
+
+        queue = asyncio.Queue(max(self.prefetch, 1))
+
+        async def read():
+            try:
+                async for item in items:
+                    self.prefetch_url(get_url(item))
+                    await queue.put((True, item))
+            except Exception as e:
+                await queue.put((False, e))
+            else:
+                await queue.put((False, None))
+
+        reader = asyncio.ensure_future(read())
+        try:
+            while True:
+                received, item = await queue.get()
+                if received:
+                    yield item
+                elif item is None:
+                    return
+                else:
+                    raise item
+        finally:
+            reader.cancel()
+
+    def clear(self):
+        self._entries.clear()
+
+    async def close(self):
+        """Closing of resolver created from string and lookups of current event loop, cache is kept"""
+
+        if self._loop is not asyncio.get_running_loop():
+            return
+        self._loop = None
+        resolver, self._resolver = self._resolver, None
+        for future in self._pending.values():
+            future.cancel()
+        self._pending = {}
+        if resolver is not None:
+            await resolver.close()
+
+    def load(self, path: str | None = None):
+        """Loading of not expired addresses from JSON file"""
+
+        with open(path or self.path, encoding='utf-8') as f:
+            data = json.load(f)
+        now = time.time()
+        for x in data:
+            if x['expires'] > now:
+                self._set_entry((x['host'], x['family']), _Entry(x['addresses'], x['expires']))
+
+    def save(self, path: str | None = None):
+        """Atomic writing of not expired addresses to JSON file, failed lookups are not saved"""
+
+        path = path or self.path
+        now = time.time()
+        data = [{'host': host, 'family': family, 'expires': entry.expires, 'addresses': entry.addresses}
+                for (host, family), entry in self._entries.items()
+                if entry.addresses is not None and entry.expires > now]
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+    def finish_run(self):
+        if self.path:
+            self.save()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.update(_pending={}, _loop=None, _resolver=None, path=None)
+        return state
@@ -0,0 +1,97 @@
+import json
+import time
+from collections import deque
+from typing import Any, NamedTuple
+
+
+class ErrorInfo(NamedTuple):
+    """Information about failed task. First two fields keep compatibility with (error, context) tuples"""
+
+    error: Exception | str
+    context: Any = None
+    status: int | None = None
+    attempts: int = 1
+    elapsed: float = 0.0
+
+    @property
+    def error_type(self) -> str:
+        if isinstance(self.error, Exception):
+            return getattr(self.error, 'type_name', None) or self.error.__class__.__name__
+        return str(self.error)
+
+    @property
+    def url(self) -> str | None:
+        return self.context if isinstance(self.context, str) else None
+
+    def to_dict(self) -> dict:
+        return {
+            'url': self.url,
+            'context': None if self.url else repr(self.context),
+            'type': self.error_type if isinstance(self.error, Exception) else None,
+            'message': str(self.error),
+            'status': self.status,
+            'attempts': self.attempts,
+            'elapsed': round(self.elapsed, 3),
+        }
+
+
+class ErrorCollector:
+    """
+    Collector of errors of one run.
+    Counts of errors by type are aggregated on adding.
+    If spill_path is set, every error is appended to JSONL file,
+    and only last max_in_memory errors are kept in memory.
+    """
+
+    def __init__(self, spill_path: str | None = None, max_in_memory: int | None = None):
+        self.spill_path = spill_path
+        self.max_in_memory = max_in_memory
+        self._entries = deque(maxlen=max_in_memory)
+        self._counts = {}
+        self._total = 0
+        self._file = None
+
+    def add(self, error, context=None, status=None, attempts=1, elapsed=0.0) -> ErrorInfo:
+        info = ErrorInfo(error, context, status, attempts, elapsed)
+        self._entries.append(info)
+        self._counts[info.error_type] = self._counts.get(info.error_type, 0) + 1
+        self._total += 1
+
+        if self.spill_path:
+            if self._file is None:
+                self._file = open(self.spill_path, 'a', encoding='utf-8')
+            self._file.write(json.dumps(info.to_dict() | {'time': time.time()}, ensure_ascii=False) + '\n')
+        return info
+
+    def append(self, item: tuple):
+        """Adding of error in (error, context) tuple format"""
+        self.add(*item)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    @property
+    def counts(self) -> dict:
+        return dict(self._counts)
+
+    @property
+    def total(self) -> int:
+        """Number of all errors, including errors removed from memory"""
+        return self._total
+
+    def __iter__(self):
+        return iter(self._entries)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __bool__(self):
+        return self._total > 0
+
+    def __getitem__(self, item):
+        return list(self._entries)[item] if isinstance(item, slice) else self._entries[item]
+
+    def __repr__(self):
+        return repr(list(self._entries))
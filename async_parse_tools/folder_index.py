@@ -0,0 +1,83 @@
+import asyncio
+import os
+
+
+class FolderIndex:
+    """
+    In-memory index of files in folders for existence checks without filesystem calls for every file.
+    Every folder is scanned once with os.scandir in thread pool on first check,
+    files written later are added with add().
+    Besides names, the index keeps name prefixes before every dot to check files with any extension.
+    Unfinished downloads ('.part' files) are ignored.
+    """
+
+    IGNORED_SUFFIXES = ('.part', '.part.json', '.part.json.tmp')
+
+    def __init__(self):
+        self._names: dict[str, set[str]] = {}
+        self._stems: dict[str, set[str]] = {}
+        self._scans: dict[str, asyncio.Future] = {}
+        self._pending: dict[str, list[str]] = {}
+
+    @staticmethod
+    def _normalize(path: str) -> str:
+        return os.path.normcase(os.path.normpath(path))
+
+    @staticmethod
+    def _get_stems(name: str):
+        index = name.find('.', 1)
+        while index != -1:
+            yield name[:index]
+            index = name.find('.', index + 1)
+
+    @staticmethod
+    def _scan(folder: str) -> list[str]:
+        try:
+            with os.scandir(folder) as entries:
+                return [entry.name for entry in entries]
+        except (FileNotFoundError, NotADirectoryError):
+            return []
+
+    async def _load(self, folder: str):
+        """Scanning of folder once, concurrent checks wait for the same scan"""
+
+        if folder in self._names:
+            return
+        scan = self._scans.get(folder)
+        if scan is None:
+            scan = self._scans[folder] = asyncio.ensure_future(asyncio.to_thread(self._scan, folder))
+        names = await asyncio.shield(scan)
+
+        if folder not in self._names:
+            self._names[folder] = set()
+            self._stems[folder] = set()
+            for name in names + self._pending.pop(folder, []):
+                self._add_name(folder, name)
+            del self._scans[folder]
+
+    def _add_name(self, folder: str, name: str):
+        if name.endswith(self.IGNORED_SUFFIXES):
+            return
+        name = os.path.normcase(name)
+        self._names[folder].add(name)
+        self._stems[folder].update(self._get_stems(name))
+
+    async def contains(self, folder: str, name: str, any_extension=False) -> bool:
+        """Checking existence of file in folder, with any extension if any_extension is True"""
+
+        folder = self._normalize(folder)
+        await self._load(folder)
+        name = os.path.normcase(name)
+        if name in self._names[folder]:
+            return True
+        return any_extension and os.path.splitext(name)[0] in self._stems[folder]
+
+    def add(self, filepath: str):
+        """Adding of written file to index of its folder, if folder is scanned or being scanned"""
+
+        folder, name = os.path.split(filepath)
+        folder = self._normalize(folder or '.')
+        if folder in self._names:
+            self._add_name(folder, name)
+        elif folder in self._scans:
+            self._pending.setdefault(folder, []).append(name)
@@ -0,0 +1,99 @@
+import hashlib
+import os
+import uuid
+
+from .sqlite_store import SqliteStore
+
+
+class HashStore(SqliteStore):
+    """
+    Persistent index of downloaded content in SQLite database: hash of content -> stored file,
+    url -> hash of its content.
+    Files with content, which is already stored, are replaced with links ('hard' or 'symlink') to stored file.
+    If skip_known_urls is True, urls with known content are linked without downloading.
+    """
+
+    SCHEMA = ('CREATE TABLE IF NOT EXISTS blobs (hash TEXT PRIMARY KEY, path TEXT, size INTEGER)',
+              'CREATE TABLE IF NOT EXISTS urls (url TEXT PRIMARY KEY, hash TEXT)')
+
+    def __init__(self, path: str, algorithm='sha256', link='hard', skip_known_urls=True):
+        if link not in ('hard', 'symlink'):
+            raise ValueError("link must be 'hard' or 'symlink'")
+        hashlib.new(algorithm)
+
+        super().__init__(path)
+        self.algorithm = algorithm
+        self.link = link
+        self.skip_known_urls = skip_known_urls
+        self.linked = 0
+
+    def new_hasher(self):
+        return hashlib.new(self.algorithm)
+
+    def get_blob(self, digest: str) -> str | None:
+        """Path of stored file with content, None if it is unknown or was removed"""
+
+        with self._db() as connection:
+            row = connection.execute('SELECT path FROM blobs WHERE hash = ?', (digest,)).fetchone()
+            if row is None:
+                return None
+            if not os.path.isfile(row[0]):
+                # Relative paths of old databases depend on working directory, they are not removed
+                if os.path.isabs(row[0]):
+                    connection.execute('DELETE FROM blobs WHERE hash = ?', (digest,))
+                return None
+        return row[0]
+
+    def get_url_blob(self, url: str) -> str | None:
+        """Path of stored file with content of url"""
+
+        with self._db() as connection:
+            row = connection.execute('SELECT hash FROM urls WHERE url = ?', (url,)).fetchone()
+        return self.get_blob(row[0]) if row else None
+
+    def add(self, url: str, filepath: str, digest: str) -> str:
+        """
+        Registration of downloaded file.
+        If content is already stored in other file, filepath is replaced with link to it.
+        Returns filepath.
+        """
+
+        blob = self.get_blob(digest)
+        if blob is None or os.path.abspath(blob) == os.path.abspath(filepath):
+            # Absolute path, so index works from any working directory
+            with self._db() as connection:
+                connection.execute('INSERT OR REPLACE INTO blobs VALUES (?, ?, ?)',
+                                   (digest, os.path.abspath(filepath), os.path.getsize(filepath)))
+        else:
+            try:
+                self.link_to(blob, filepath)
+            except OSError:
+                # Links are not supported (other device, file system), file is kept as is
+                pass
+        with self._db() as connection:
+            connection.execute('INSERT OR REPLACE INTO urls VALUES (?, ?)', (url, digest))
+        return filepath
+
+    def link_to(self, blob: str, filepath: str):
+        """Atomic replacement of filepath with link to blob"""
+
+        if os.path.exists(filepath) and os.path.samefile(blob, filepath):
+            return
+        tmp_path = f'{filepath}.{uuid.uuid4().hex}.tmp'
+        if self.link == 'hard':
+            os.link(blob, tmp_path)
+        else:
+            os.symlink(os.path.abspath(blob), tmp_path)
+        try:
+            os.replace(tmp_path, filepath)
+        except OSError:
+            os.remove(tmp_path)
+            raise
+        self.linked += 1
+
+    def hash_file(self, path: str, hasher=None, chunk_size=1024 * 1024):
+        hasher = hasher or self.new_hasher()
+        with open(path, 'rb') as f:
+            while chunk := f.read(chunk_size):
+                hasher.update(chunk)
+        return hasher
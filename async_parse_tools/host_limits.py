@@ -0,0 +1,117 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from urllib.parse import urlparse
+
+
+def get_host(url) -> str:
+    """Returns netloc of url in lower case"""
+    return urlparse(str(url)).netloc.lower()
+
+
+class TokenBucket:
+    """Token bucket limiting number of actions per second"""
+
+    def __init__(self, rate: float, burst=1):
+        if rate <= 0:
+            raise ValueError('rate must be positive')
+        self.rate = rate
+        self.capacity = max(burst, 1)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def is_full(self) -> bool:
+        """Bucket is refilled, so removing of it does not change limits"""
+        return not self._lock.locked() and \
+            self.tokens + (time.monotonic() - self.updated) * self.rate >= self.capacity
+
+
+class _HostLimits:
+    __slots__ = ('semaphore', 'bucket', 'users')
+
+    def __init__(self, semaphore: asyncio.Semaphore | None, bucket: TokenBucket | None):
+        self.semaphore = semaphore
+        self.bucket = bucket
+        self.users = 0
+
+    def is_idle(self) -> bool:
+        return not self.users and (self.bucket is None or self.bucket.is_full())
+
+
+class HostLimiter:
+    """
+    Per host limits of concurrent requests and requests per second.
+    Settings of specific hosts are passed as dict:
+    {'example.com': {'limit': 2, 'rate': 0.5, 'burst': 1}}
+    Limits of idle hosts (without requests and with refilled bucket) are removed,
+    so number of kept hosts does not grow during long runs.
+    Only limiting is provided: tasks of busy hosts wait for their slots, while tasks of other hosts
+    from lookahead window of runner are started, order of tasks is not changed.
+    """
+
+    PRUNE_AT = 1000
+
+    def __init__(self, limit_per_host=0, rate_per_host: float | None = None, burst=1, hosts: dict | None = None):
+        self.limit_per_host = limit_per_host
+        self.rate_per_host = rate_per_host
+        self.burst = burst
+        self.hosts = {k.lower(): v for k, v in (hosts or {}).items()}
+        self._limits: dict[str, _HostLimits] = {}
+        self._prune_at = self.PRUNE_AT
+
+    @property
+    def enabled(self):
+        return bool(self.limit_per_host or self.rate_per_host or self.hosts)
+
+    def _get_limits(self, host) -> _HostLimits:
+        limits = self._limits.get(host)
+        if limits is None:
+            if len(self._limits) >= self._prune_at:
+                self._prune()
+            settings = self.hosts.get(host) or self.hosts.get(host.split(':')[0]) or {}
+            limit = settings.get('limit', self.limit_per_host)
+            rate = settings.get('rate', self.rate_per_host)
+            burst = settings.get('burst', self.burst)
+            limits = _HostLimits(asyncio.Semaphore(limit) if limit else None,
+                                 TokenBucket(rate, burst) if rate else None)
+            self._limits[host] = limits
+        return limits
+
+    def _prune(self):
+        """Removing of limits of idle hosts, next pruning is done when number of hosts doubles"""
+
+        for host in [k for k, v in self._limits.items() if v.is_idle()]:
+            del self._limits[host]
+        self._prune_at = max(self.PRUNE_AT, len(self._limits) * 2)
+
+    @asynccontextmanager
+    async def limit(self, url):
+        host = get_host(url)
+        limits = self._get_limits(host)
+        limits.users += 1
+        try:
+            if limits.semaphore:
+                await limits.semaphore.acquire()
+            try:
+                if limits.bucket:
+                    await limits.bucket.acquire()
+                yield
+            finally:
+                if limits.semaphore:
+                    limits.semaphore.release()
+        finally:
+            limits.users -= 1
+            if limits.is_idle() and self._limits.get(host) is limits:
+                del self._limits[host]
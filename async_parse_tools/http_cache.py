@@ -0,0 +1,126 @@
+import asyncio
+import hashlib
+import json
+import time
+from typing import NamedTuple
+
+from .sqlite_store import SqliteStore
+
+
+class CacheEntry(NamedTuple):
+    url: str
+    body: bytes
+    etag: str | None
+    last_modified: str | None
+    stored_at: float
+
+    def is_fresh(self, ttl: float | None) -> bool:
+        return ttl is not None and time.time() - self.stored_at < ttl
+
+    @property
+    def conditional_headers(self) -> dict:
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+class HttpCache(SqliteStore):
+    """
+    Persistent cache of responses in SQLite database, shared between processes.
+    Entries younger than ttl are returned without requests, older ones are revalidated
+    with If-None-Match/If-Modified-Since. If ttl is None, every entry is revalidated.
+    If max_size (bytes) is set, least recently used entries are removed as soon as size of bodies exceeds it.
+    """
+
+    SCHEMA = ('CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, url TEXT, body BLOB, etag TEXT, '
+              'last_modified TEXT, size INTEGER, stored_at REAL, accessed_at REAL)',
+              'CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)')
+
+    def __init__(self, path: str, ttl: float | None = None, max_size: int | None = None):
+        super().__init__(path)
+        self.ttl = ttl
+        self.max_size = max_size
+        self._size = None
+
+    @staticmethod
+    def make_key(method: str, url: str, params=None) -> str:
+        raw = json.dumps([method.upper(), url, params], sort_keys=True, default=str)
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def get(self, key: str) -> CacheEntry | None:
+        with self._db() as connection:
+            row = connection.execute('SELECT url, body, etag, last_modified, stored_at FROM responses WHERE key = ?',
+                                     (key,)).fetchone()
+            if row is None:
+                return None
+            connection.execute('UPDATE responses SET accessed_at = ? WHERE key = ?', (time.time(), key))
+            return CacheEntry(*row)
+
+    def set(self, key: str, url: str, body: bytes, etag: str | None = None, last_modified: str | None = None):
+        now = time.time()
+        with self._db() as connection:
+            if self.max_size is not None:
+                if self._size is None:
+                    self._size = self._get_size(connection)
+                row = connection.execute('SELECT size FROM responses WHERE key = ?', (key,)).fetchone()
+                self._size += len(body) - (row[0] if row else 0)
+            connection.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                               (key, url, body, etag, last_modified, len(body), now, now))
+            if self._size is not None and self._size > self.max_size:
+                self._evict(connection, self._get_size(connection))
+
+    def touch(self, key: str):
+        """Marking entry as revalidated"""
+        now = time.time()
+        with self._db() as connection:
+            connection.execute('UPDATE responses SET stored_at = ?, accessed_at = ? WHERE key = ?',
+                               (now, now, key))
+
+    def evict(self):
+        """Removing least recently used entries while size of cache is more than max_size"""
+
+        if self.max_size is None:
+            return
+        with self._db() as connection:
+            self._evict(connection, self._get_size(connection))
+
+    @staticmethod
+    def _get_size(connection) -> int:
+        return connection.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+
+    def _evict(self, connection, total: int):
+        """Size of bodies is counted again, because cache can be filled by other processes"""
+
+        keys = []
+        if total > self.max_size:
+            for key, size in connection.execute('SELECT key, size FROM responses ORDER BY accessed_at'):
+                if total <= self.max_size:
+                    break
+                keys.append((key,))
+                total -= size
+            connection.executemany('DELETE FROM responses WHERE key = ?', keys)
+        self._size = total
+
+    async def get_async(self, key: str) -> CacheEntry | None:
+        return await asyncio.to_thread(self.get, key)
+
+    async def set_async(self, key: str, url: str, body: bytes, etag: str | None = None,
+                        last_modified: str | None = None):
+        await asyncio.to_thread(self.set, key, url, body, etag, last_modified)
+
+    async def touch_async(self, key: str):
+        await asyncio.to_thread(self.touch, key)
+
+    def finish_run(self):
+        """Removing of entries over max_size and closing of connection, which is reopened by next query"""
+
+        self.evict()
+        self.close()
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        state.update(_size=None)
+        return state
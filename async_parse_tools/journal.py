@@ -0,0 +1,130 @@
+import asyncio
+import pickle
+import time
+from typing import Any
+
+from .sqlite_store import SqliteStore
+
+
+class Journal(SqliteStore):
+    """
+    Append-only journal of processed items in SQLite database.
+    Items of restarted run, which are done, are skipped (their results are returned, if store_results is True).
+    Failed and started, but not finished items are processed again.
+    If retry_failed is False, failed items are skipped too.
+    States are written by batches of batch_size items (only the last state of item in batch is written),
+    states, which are not written before crash, are processed again in next run.
+    """
+
+    STARTED = 'started'
+    DONE = 'done'
+    FAILED = 'failed'
+
+    SCHEMA = ('CREATE TABLE IF NOT EXISTS items (key TEXT PRIMARY KEY, state TEXT, result BLOB, error TEXT, '
+              'updated REAL)',)
+
+    def __init__(self, path: str, store_results=False, retry_failed=True, batch_size=100):
+        super().__init__(path)
+        self.store_results = store_results
+        self.retry_failed = retry_failed
+        self.batch_size = batch_size
+        self.skipped = 0
+        self._buffer: dict[str, tuple] = {}
+        self._writing: list[dict[str, tuple]] = []
+
+    def get(self, key: str) -> tuple[str, Any] | None:
+        """Returns (state, result) of item or None"""
+
+        for rows in (self._buffer, *self._writing):
+            if key in rows:
+                row = rows[key][1:3]
+                break
+        else:
+            with self._db() as connection:
+                row = connection.execute('SELECT state, result FROM items WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        state, result = row
+        return state, pickle.loads(result) if result is not None else None
+
+    def should_skip(self, key: str) -> tuple[bool, Any]:
+        """Returns (skip, stored result)"""
+
+        return self._check_entry(self.get(key))
+
+    async def should_skip_async(self, key: str) -> tuple[bool, Any]:
+        """should_skip with reading of database in thread"""
+        return self._check_entry(await asyncio.to_thread(self.get, key))
+
+    def _check_entry(self, entry: tuple[str, Any] | None) -> tuple[bool, Any]:
+        if entry is None:
+            return False, None
+        state, result = entry
+        if state == self.DONE or (state == self.FAILED and not self.retry_failed):
+            self.skipped += 1
+            return True, result
+        return False, None
+
+    def _write(self, key: str, state: str, result: bytes | None = None, error: str | None = None):
+        self._buffer[key] = (key, state, result, error, time.time())
+
+    def mark_started(self, key: str):
+        self._write(key, self.STARTED)
+
+    def mark_done(self, key: str, result=None):
+        data = None
+        if self.store_results and result is not None:
+            try:
+                data = pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)
+            except Exception:
+                data = None
+        self._write(key, self.DONE, data)
+
+    def mark_failed(self, key: str, error: str | None = None):
+        self._write(key, self.FAILED, error=error)
+
+    @property
+    def needs_flush(self) -> bool:
+        return len(self._buffer) >= self.batch_size
+
+    def _write_rows(self, rows: dict[str, tuple]):
+        if not rows:
+            return
+        with self._db() as connection:
+            connection.execute('BEGIN')
+            try:
+                connection.executemany('INSERT OR REPLACE INTO items VALUES (?, ?, ?, ?, ?)', rows.values())
+            except BaseException:
+                connection.execute('ROLLBACK')
+                raise
+            connection.execute('COMMIT')
+
+    def flush(self):
+        rows, self._buffer = self._buffer, {}
+        self._write_rows(rows)
+
+    async def flush_async(self):
+        """Writing of buffered states in thread"""
+
+        rows, self._buffer = self._buffer, {}
+        if not rows:
+            return
+        self._writing.append(rows)
+        try:
+            await asyncio.to_thread(self._write_rows, rows)
+        finally:
+            self._writing.remove(rows)
+
+    def counts(self) -> dict:
+        self.flush()
+        with self._db() as connection:
+            return dict(connection.execute('SELECT state, COUNT(*) FROM items GROUP BY state').fetchall())
+
+    def close(self):
+        self.flush()
+        super().close()
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        state.update(_buffer={}, _writing=[])
+        return state
@@ -0,0 +1,297 @@
+import asyncio
+import json
+import os
+import time
+from types import SimpleNamespace
+from typing import Any, Callable
+
+import aiohttp
+
+from .host_limits import get_host
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    """Cumulative histogram of durations in seconds with fixed buckets"""
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                return
+        self.counts[-1] += 1
+
+    def merge(self, other: 'Histogram'):
+        if other.buckets != self.buckets:
+            raise ValueError('Histograms with different buckets can not be merged')
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.sum += other.sum
+
+    def quantile(self, q: float) -> float | None:
+        """Upper bound of bucket containing quantile q"""
+
+        if not self.count:
+            return None
+        rank = q * self.count
+        total = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            if total >= rank:
+                return bound
+        return float('inf')
+
+    def to_dict(self) -> dict:
+        return {
+            'count': self.count,
+            'sum': round(self.sum, 6),
+            'avg': round(self.sum / self.count, 6) if self.count else None,
+            'p50': self.quantile(0.5),
+            'p99': self.quantile(0.99),
+            'buckets': {str(b): c for b, c in zip(self.buckets + ('+Inf',), self.counts)},
+        }
+
+
+class RequestTrace(SimpleNamespace):
+    """Timings of one request, filled by trace signals of aiohttp and by runners"""
+
+    url: str
+    host: str
+    start: float
+    dns: float | None = None
+    connect: float | None = None
+    ttfb: float | None = None
+    body: float | None = None
+    total: float | None = None
+    reused: bool | None = None
+    bytes_in: int = 0
+    bytes_out: int = 0
+    status: int | None = None
+    error: str | None = None
+
+
+class Metrics:
+    """
+    Metrics of runners: timings of requests (dns, connect, ttfb, body, total) and callbacks,
+    bytes in and out, reuse of connections, retries, status counts by host.
+    callback(trace) is called for every finished request with RequestTrace.
+    If path is set, snapshot is written to file (format 'json' or 'prometheus') at the end of every run
+    and every interval seconds during runs, if interval is set.
+    """
+
+    def __init__(self, callback: Callable[[RequestTrace], Any] | None = None, path: str | None = None,
+                 format='json', interval: float | None = None, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        if format not in ('json', 'prometheus'):
+            raise ValueError("format must be 'json' or 'prometheus'")
+        self.callback = callback
+        self.path = path
+        self.format = format
+        self.interval = interval
+        self.buckets = buckets
+        self._writer = None
+        self.reset()
+
+    def reset(self):
+        self.timings: dict[str, Histogram] = {}
+        self.requests = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.connections_created = 0
+        self.connections_reused = 0
+        self.retries = 0
+        self.statuses: dict[str, dict[str, int]] = {}
+        self.retries_by_host: dict[str, int] = {}
+
+    def observe(self, name: str, value: float):
+        if name not in self.timings:
+            self.timings[name] = Histogram(self.buckets)
+        self.timings[name].observe(value)
+
+    def add_status(self, host: str, status: int | str):
+        host_statuses = self.statuses.setdefault(host, {})
+        host_statuses[str(status)] = host_statuses.get(str(status), 0) + 1
+
+    def add_retry(self, url=None):
+        self.retries += 1
+        if isinstance(url, str):
+            host = get_host(url)
+            self.retries_by_host[host] = self.retries_by_host.get(host, 0) + 1
+
+    def start_request(self, url: str) -> RequestTrace:
+        """Trace of request, which is passed to aiohttp as trace_request_ctx"""
+
+        self._start_writer()
+        return RequestTrace(url=url, host=get_host(url), start=time.perf_counter())
+
+    def finish_request(self, trace: RequestTrace, error: BaseException | None = None):
+        """Recording of request after reading of body or error"""
+
+        now = time.perf_counter()
+        trace.total = now - trace.start
+        if trace.ttfb is not None:
+            trace.body = trace.total - trace.ttfb
+        trace.error = error.__class__.__name__ if error is not None else None
+
+        self.requests += 1
+        self.bytes_in += trace.bytes_in
+        self.bytes_out += trace.bytes_out
+        for name in ('dns', 'connect', 'ttfb', 'body', 'total'):
+            value = getattr(trace, name)
+            if value is not None:
+                self.observe(name, value)
+        self.add_status(trace.host, trace.status if trace.status is not None else trace.error or 'unknown')
+
+        if self.callback is not None:
+            self.callback(trace)
+
+    def trace_config(self) -> aiohttp.TraceConfig:
+        """TraceConfig filling RequestTrace, passed as trace_request_ctx"""
+
+        config = aiohttp.TraceConfig()
+
+        def handler(func):
+            async def on_signal(session, context, params):
+                trace = context.trace_request_ctx
+                if isinstance(trace, RequestTrace):
+                    func(trace, context, params)
+            return on_signal
+
+        def on_dns_start(trace, context, params):
+            context.dns_start = time.perf_counter()
+
+        def on_dns_end(trace, context, params):
+            trace.dns = time.perf_counter() - context.dns_start
+
+        def on_connection_start(trace, context, params):
+            context.connection_start = time.perf_counter()
+
+        def on_connection_end(trace, context, params):
+            trace.connect = time.perf_counter() - context.connection_start - (trace.dns or 0.0)
+            trace.reused = False
+            self.connections_created += 1
+
+        def on_connection_reuse(trace, context, params):
+            trace.reused = True
+            self.connections_reused += 1
+
+        def on_request_end(trace, context, params):
+            trace.ttfb = time.perf_counter() - trace.start
+            trace.status = params.response.status
+
+        def on_chunk_sent(trace, context, params):
+            trace.bytes_out += len(params.chunk)
+
+        def on_chunk_received(trace, context, params):
+            trace.bytes_in += len(params.chunk)
+
+        config.on_dns_resolvehost_start.append(handler(on_dns_start))
+        config.on_dns_resolvehost_end.append(handler(on_dns_end))
+        config.on_connection_create_start.append(handler(on_connection_start))
+        config.on_connection_create_end.append(handler(on_connection_end))
+        config.on_connection_reuseconn.append(handler(on_connection_reuse))
+        config.on_request_end.append(handler(on_request_end))
+        config.on_request_chunk_sent.append(handler(on_chunk_sent))
+        config.on_response_chunk_received.append(handler(on_chunk_received))
+        return config
+
+    def merge(self, other: 'Metrics'):
+        """Adding of metrics collected by other instance, for example in worker process"""
+
+        for name, histogram in other.timings.items():
+            if name not in self.timings:
+                self.timings[name] = Histogram(histogram.buckets)
+            self.timings[name].merge(histogram)
+        for name in ('requests', 'bytes_in', 'bytes_out', 'connections_created', 'connections_reused', 'retries'):
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        for host, statuses in other.statuses.items():
+            for status, count in statuses.items():
+                host_statuses = self.statuses.setdefault(host, {})
+                host_statuses[status] = host_statuses.get(status, 0) + count
+        for host, count in other.retries_by_host.items():
+            self.retries_by_host[host] = self.retries_by_host.get(host, 0) + count
+
+    def snapshot(self) -> dict:
+        return {
+            'time': time.time(),
+            'requests': self.requests,
+            'bytes_in': self.bytes_in,
+            'bytes_out': self.bytes_out,
+            'connections_created': self.connections_created,
+            'connections_reused': self.connections_reused,
+            'retries': self.retries,
+            'retries_by_host': dict(self.retries_by_host),
+            'statuses': {host: dict(x) for host, x in self.statuses.items()},
+            'timings': {name: x.to_dict() for name, x in self.timings.items()},
+        }
+
+    def to_prometheus(self, prefix='async_parse_tools') -> str:
+        """Snapshot in Prometheus text format"""
+
+        lines = []
+        declared = set()
+
+        def metric(name, kind, value, labels=''):
+            if name not in declared:
+                declared.add(name)
+                lines.append(f'# TYPE {prefix}_{name} {kind}')
+            lines.append(f'{prefix}_{name}{labels} {value}')
+
+        for name in ('requests', 'bytes_in', 'bytes_out', 'connections_created', 'connections_reused', 'retries'):
+            metric(name + '_total', 'counter', getattr(self, name))
+        for host, statuses in self.statuses.items():
+            for status, count in statuses.items():
+                metric('responses_total', 'counter', count, f'{{host="{host}",status="{status}"}}')
+        for host, count in self.retries_by_host.items():
+            metric('host_retries_total', 'counter', count, f'{{host="{host}"}}')
+        for name, histogram in self.timings.items():
+            lines.append(f'# TYPE {prefix}_{name}_seconds histogram')
+            total = 0
+            for bound, count in zip(histogram.buckets + ('+Inf',), histogram.counts):
+                total += count
+                lines.append(f'{prefix}_{name}_seconds_bucket{{le="{bound}"}} {total}')
+            lines.append(f'{prefix}_{name}_seconds_sum {histogram.sum}')
+            lines.append(f'{prefix}_{name}_seconds_count {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path: str | None = None, format: str | None = None):
+        """Atomic writing of snapshot to file"""
+
+        path = path or self.path
+        format = format or self.format
+        data = self.to_prometheus() if format == 'prometheus' else json.dumps(self.snapshot(), indent=2)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def _start_writer(self):
+        if self.path and self.interval and self._writer is None:
+            self._writer = asyncio.ensure_future(self._write_periodically())
+
+    async def _write_periodically(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await asyncio.to_thread(self.write)
+
+    def finish_run(self):
+        """Stopping of periodic writing and writing of final snapshot"""
+
+        if self._writer is not None:
+            self._writer.cancel()
+            self._writer = None
+        if self.path:
+            self.write()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.update(_writer=None, callback=None, path=None)
+        return state
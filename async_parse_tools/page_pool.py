@@ -0,0 +1,114 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable
+
+from playwright.async_api import BrowserContext, Page
+
+
+class PagePool:
+    """
+    Pool of pages of browser context.
+    Pages are created on demand up to size and recycled after max_uses uses, crash or failed reset.
+    By default (max_uses=1) every page is used once. Reused pages are reset between uses:
+    'about:blank' is opened, routes of page are removed and viewport is restored.
+    Other state set by page functions is kept: event listeners, exposed functions and bindings,
+    init scripts, extra HTTP headers, emulated media and geolocation, and also cookies and storage of context.
+    """
+
+    def __init__(self, context: BrowserContext, size: int, max_uses: int | None = 1,
+                 setup_page: Callable[[Page], Awaitable[None]] | None = None):
+        self.context = context
+        self.size = size
+        self.max_uses = max_uses
+        self.setup_page = setup_page
+        self._slots = asyncio.Semaphore(size)
+        self._idle: list[Page] = []
+        self._uses: dict[Page, int] = {}
+        self._viewports: dict[Page, dict | None] = {}
+        self._crashed: set[Page] = set()
+        self.created = 0
+        self.recycled = 0
+        self._in_use = 0
+
+    @property
+    def available(self) -> int:
+        """Number of free pages (including pages which are not created yet)"""
+        return self.size - self._in_use
+
+    async def _new_page(self) -> Page:
+        page = await self.context.new_page()
+        page.on('crash', self._crashed.add)
+        if self.setup_page:
+            await self.setup_page(page)
+        self._uses[page] = 0
+        self._viewports[page] = page.viewport_size
+        self.created += 1
+        return page
+
+    async def acquire(self) -> Page:
+        self._in_use += 1
+        try:
+            await self._slots.acquire()
+        except BaseException:
+            self._in_use -= 1
+            raise
+        try:
+            while self._idle:
+                page = self._idle.pop()
+                if not self._is_broken(page):
+                    return page
+                await self._close_page(page)
+            return await self._new_page()
+        except BaseException:
+            self._slots.release()
+            self._in_use -= 1
+            raise
+
+    async def release(self, page: Page):
+        try:
+            self._uses[page] = self._uses.get(page, 0) + 1
+            if self._is_broken(page) or (self.max_uses and self._uses[page] >= self.max_uses):
+                await self._close_page(page)
+                return
+
+            try:
+                await self._reset_page(page)
+            except Exception:
+                await self._close_page(page)
+            else:
+                self._idle.append(page)
+        finally:
+            self._slots.release()
+            self._in_use -= 1
+
+    @asynccontextmanager
+    async def page(self):
+        page = await self.acquire()
+        try:
+            yield page
+        finally:
+            await self.release(page)
+
+    async def _reset_page(self, page: Page):
+        await page.goto('about:blank')
+        await page.unroute_all(behavior='ignoreErrors')
+        viewport = self._viewports.get(page)
+        if viewport is not None and page.viewport_size != viewport:
+            await page.set_viewport_size(viewport)
+
+    def _is_broken(self, page: Page):
+        return page in self._crashed or page.is_closed()
+
+    async def _close_page(self, page: Page):
+        self._uses.pop(page, None)
+        self._viewports.pop(page, None)
+        self._crashed.discard(page)
+        self.recycled += 1
+        try:
+            await page.close()
+        except Exception:
+            pass
+
+    async def close(self):
+        while self._idle:
+            await self._close_page(self._idle.pop())
@@ -0,0 +1,89 @@
+import asyncio
+import random
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+import aiohttp
+
+RETRY_STATUSES = (408, 425, 429, 500, 502, 503, 504)
+RETRY_EXCEPTIONS = (aiohttp.ClientError, asyncio.TimeoutError)
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """Converting value of Retry-After header (seconds or HTTP date) to seconds"""
+
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return max(0.0, (date - datetime.now(timezone.utc)).total_seconds())
+
+
+class RetryPolicy:
+    """
+    Policy of retrying failed tasks.
+
+    Delay before attempt n + 1 is backoff * factor ** (n - 1), limited by max_backoff
+    and randomly reduced by up to jitter part of it.
+    retry_statuses - HTTP statuses to retry, None to retry any status.
+    retry_exceptions - exception types to retry, None to retry any exception.
+    If respect_retry_after is True, Retry-After header of 429/503 answers is used as minimal delay.
+    budget - maximum number of retries of all tasks in one run, None for unlimited.
+    If release_slot is True, concurrency slot is released while waiting for next attempt.
+    """
+
+    def __init__(self, max_tries=5, backoff=0.5, factor=2, max_backoff=60, jitter=0.5,
+                 retry_statuses: tuple | None = RETRY_STATUSES,
+                 retry_exceptions: tuple | None = RETRY_EXCEPTIONS,
+                 respect_retry_after=True, max_retry_after=300,
+                 budget: int | None = None, release_slot=False):
+        self.max_tries = max_tries
+        self.backoff = backoff
+        self.factor = factor
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.retry_statuses = retry_statuses
+        self.retry_exceptions = retry_exceptions
+        self.respect_retry_after = respect_retry_after
+        self.max_retry_after = max_retry_after
+        self.budget = budget
+        self.release_slot = release_slot
+
+    @classmethod
+    def fixed(cls, max_tries=5, wait_time=2):
+        """Policy retrying any error with fixed delay"""
+        return cls(max_tries=max_tries, backoff=wait_time, factor=1, max_backoff=wait_time, jitter=0,
+                   retry_statuses=None, retry_exceptions=None, respect_retry_after=False)
+
+    def is_retryable(self, error: BaseException) -> bool:
+        if isinstance(error, aiohttp.ClientResponseError):
+            return self.retry_statuses is None or error.status in self.retry_statuses
+        return self.retry_exceptions is None or isinstance(error, self.retry_exceptions)
+
+    def get_delay(self, error: BaseException, attempt: int) -> float | None:
+        """Returns delay before next attempt or None, if task should not be retried"""
+
+        if attempt >= self.max_tries or not self.is_retryable(error):
+            return None
+
+        delay = min(self.backoff * self.factor ** (attempt - 1), self.max_backoff)
+        if self.jitter:
+            delay *= 1 - self.jitter * random.random()
+
+        if (self.respect_retry_after and isinstance(error, aiohttp.ClientResponseError)
+                and error.status in (429, 503) and error.headers):
+            retry_after = parse_retry_after(error.headers.get('Retry-After'))
+            if retry_after is not None:
+                if retry_after > self.max_retry_after:
+                    return None
+                delay = max(delay, retry_after)
+
+        return delay
@@ -0,0 +1,198 @@
+import asyncio
+import multiprocessing
+import os
+import pickle
+import queue
+import zlib
+from collections import deque
+from itertools import islice
+
+import tqdm
+
+from .errors import ErrorInfo
+from .host_limits import get_host
+
+
+class RemoteError(Exception):
+    """Error from worker process, which can not be transferred as is"""
+
+    def __init__(self, type_name: str, message: str):
+        super().__init__(type_name, message)
+        self.type_name = type_name
+        self.message = message
+
+    def __str__(self):
+        return f'{self.type_name}: {self.message}'
+
+
+def _dumps(obj) -> bytes:
+    return pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _dump_error(info: ErrorInfo) -> bytes:
+    try:
+        return _dumps(info)
+    except Exception:
+        error = info.error
+        if isinstance(error, Exception):
+            error = RemoteError(error.__class__.__name__, str(error))
+        return _dumps(info._replace(error=error, context=str(info.context)))
+
+
+def _dump_stats(runner) -> bytes:
+    """Counters of worker, which are merged into runner of parent process"""
+
+    if runner.watchdog is not None:
+        # Handler is not needed in parent process and may be not picklable
+        runner.watchdog.on_slow = None
+    return _dumps({'skipped': runner.journal.skipped if runner.journal is not None else 0,
+                   'metrics': runner.metrics, 'watchdog': runner.watchdog})
+
+
+def _merge_stats(runner, data: bytes):
+    stats = pickle.loads(data)
+    if runner.journal is not None:
+        runner.journal.skipped += stats['skipped']
+    if runner.metrics is not None and stats['metrics'] is not None:
+        runner.metrics.merge(stats['metrics'])
+    if runner.watchdog is not None and stats['watchdog'] is not None:
+        runner.watchdog.merge(stats['watchdog'])
+
+
+def shard_worker(runner, worker_id: int, args: tuple, in_queue, out_queue):
+    """Worker process: runs own event loop and session over items received from in_queue"""
+
+    async def items():
+        while True:
+            batch = await asyncio.to_thread(in_queue.get)
+            if batch is None:
+                return
+            for item in batch:
+                yield item
+
+    async def main():
+        runner._reset_run_state()
+        async for result in runner._iter_run(items(), *args):
+            try:
+                data = _dumps(result)
+            except Exception as e:
+                raise TypeError(f'Result is not picklable: {e!r}')
+            out_queue.put(('result', worker_id, data))
+
+    runner.visuals_settings(use_statusbar=False, print_errors_string=False)
+    runner.errors_path = None
+    # Metrics and watchdog data of worker are merged into parent process, which writes their files
+    if runner.metrics is not None:
+        runner.metrics.path = None
+        runner.metrics.reset()
+    if runner.watchdog is not None:
+        runner.watchdog.path = None
+        runner.watchdog.reset()
+    # Run of parent process is copied with runner, when processes are forked
+    runner._running = False
+    try:
+        asyncio.run(main())
+    except BaseException as e:
+        out_queue.put(('failed', worker_id, f'{e.__class__.__name__}: {e}'))
+        raise
+    finally:
+        runner._finish_run()
+    out_queue.put(('errors', worker_id, [_dump_error(x) for x in runner.errors]))
+    out_queue.put(('done', worker_id, _dump_stats(runner)))
+
+
+def iter_sharded(runner, urls, args: tuple, processes: int | None = None, ordered=True,
+                 shard_by_host=False, chunk_size=100, max_pending: int | None = None):
+    """
+    Splitting urls between worker processes and merging their results.
+    Items are sent to workers in chunks (by hash of host, if shard_by_host is True,
+    otherwise round-robin), not more than max_pending items are processed at once.
+    Errors of workers are added to runner.errors, their skipped items, metrics and watchdog data
+    are merged into journal, metrics and watchdog of runner.
+    """
+
+    processes = processes or os.cpu_count() or 1
+    max_pending = max_pending or processes * chunk_size * 4
+    context = multiprocessing.get_context()
+    out_queue = context.Queue()
+    in_queues = [context.Queue() for _ in range(processes)]
+    workers = [context.Process(target=shard_worker, args=(runner, i, args, in_queues[i], out_queue), daemon=True)
+               for i in range(processes)]
+    for w in workers:
+        w.start()
+
+    sent = [deque() for _ in range(processes)]
+    buffer = {}
+    next_index = 0
+    pending = 0
+    finished = 0
+    items = enumerate([urls] if isinstance(urls, str) else urls)
+    exhausted = False
+    round_robin = 0
+
+    def send_chunk():
+        nonlocal exhausted, pending, round_robin
+        chunk = list(islice(items, chunk_size * (processes if shard_by_host else 1)))
+        if not chunk:
+            exhausted = True
+            for q in in_queues:
+                q.put(None)
+            return
+
+        batches = [[] for _ in range(processes)]
+        for index, item in chunk:
+            if shard_by_host:
+                url = item.get('url') if isinstance(item, dict) else item
+                worker_id = zlib.crc32(get_host(str(url).strip()).encode()) % processes
+            else:
+                worker_id = round_robin
+            batches[worker_id].append(item)
+            sent[worker_id].append(index)
+        round_robin = (round_robin + 1) % processes
+
+        for worker_id, batch in enumerate(batches):
+            if batch:
+                in_queues[worker_id].put(batch)
+        pending += len(chunk)
+
+    completed = False
+    try:
+        with tqdm.tqdm(total=runner._get_length(urls), ascii=runner.statusbar_ascii,
+                       disable=not runner.use_statusbar) as pbar:
+            while finished < processes:
+                while not exhausted and pending < max_pending:
+                    send_chunk()
+
+                try:
+                    kind, worker_id, data = out_queue.get(timeout=1)
+                except queue.Empty:
+                    dead = [w for w in workers if not w.is_alive() and w.exitcode]
+                    if dead:
+                        raise RuntimeError(f'Worker process exited with code {dead[0].exitcode}')
+                    continue
+
+                if kind == 'result':
+                    index = sent[worker_id].popleft()
+                    pending -= 1
+                    pbar.update()
+                    if not ordered:
+                        yield pickle.loads(data)
+                        continue
+                    buffer[index] = pickle.loads(data)
+                    while next_index in buffer:
+                        yield buffer.pop(next_index)
+                        next_index += 1
+                elif kind == 'errors':
+                    for info in data:
+                        runner.errors.add(*pickle.loads(info))
+                elif kind == 'done':
+                    _merge_stats(runner, data)
+                    finished += 1
+                elif kind == 'failed':
+                    raise RuntimeError(f'Worker process failed: {data}')
+        completed = True
+    finally:
+        for w in workers:
+            if not completed:
+                w.terminate()
+            w.join()
@@ -0,0 +1,216 @@
+import asyncio
+import csv
+import inspect
+import json
+import os
+import sqlite3
+from abc import ABC, abstractmethod
+from typing import Any, Awaitable, Callable, NamedTuple, Sequence
+
+
+class RunStats(NamedTuple):
+    """Summary of run, returned instead of results if return_stats is set"""
+
+    items: int
+    results: int
+    errors: int
+    skipped: int
+    elapsed: float
+
+
+class ResultSink(ABC):
+    """
+    Receiver of results, which are written by batches as they complete.
+    Batch is written when batch_size results are collected or flush_interval seconds have passed.
+    Results of failed tasks (None, or (url, None) of AsyncDownloader) are skipped by runners, if skip_none is True.
+    """
+
+    def __init__(self, batch_size=100, flush_interval: float | None = 5.0, skip_none=True):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.skip_none = skip_none
+        self.written = 0
+        self._buffer = []
+        self._lock = None
+        self._timer = None
+
+    async def open(self):
+        self._lock = asyncio.Lock()
+        if self.flush_interval:
+            self._timer = asyncio.create_task(self._flush_periodically())
+
+    async def add(self, item):
+        if item is None and self.skip_none:
+            return
+        self._buffer.append(item)
+        if len(self._buffer) >= self.batch_size:
+            await self.flush()
+
+    async def flush(self):
+        async with self._lock:
+            if not self._buffer:
+                return
+            batch, self._buffer = self._buffer, []
+            await self.write(batch)
+            self.written += len(batch)
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def close(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        try:
+            await self.flush()
+        finally:
+            await self._close()
+
+    @abstractmethod
+    async def write(self, batch: list):
+        """Writing of batch of results"""
+
+    async def _close(self):
+        pass
+
+
+class _FileSink(ResultSink, ABC):
+    """Sink writing to text file in thread pool"""
+
+    def __init__(self, path: str, batch_size=100, flush_interval: float | None = 5.0, skip_none=True, append=True):
+        super().__init__(batch_size, flush_interval, skip_none)
+        self.path = path
+        self.append = append
+        self._file = None
+
+    async def open(self):
+        await super().open()
+        folder = os.path.dirname(self.path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self._file = await asyncio.to_thread(open, self.path, 'a' if self.append else 'w',
+                                             encoding='utf-8', newline='')
+
+    async def write(self, batch: list):
+        await asyncio.to_thread(self._write_batch, batch)
+
+    @abstractmethod
+    def _write_batch(self, batch: list):
+        pass
+
+    async def _close(self):
+        if self._file is not None:
+            await asyncio.to_thread(self._file.close)
+            self._file = None
+
+
+class JsonlSink(_FileSink):
+    """Results are written as JSON lines, not serializable values are converted to strings"""
+
+    def _write_batch(self, batch: list):
+        self._file.write(''.join(json.dumps(x, ensure_ascii=False, default=str) + '\n' for x in batch))
+        self._file.flush()
+
+
+class CsvSink(_FileSink):
+    """
+    Results are written as CSV rows.
+    Dict results are written by fieldnames (keys of first result by default), sequences as is,
+    other values as one column.
+    """
+
+    def __init__(self, path: str, fieldnames: Sequence[str] | None = None, batch_size=100,
+                 flush_interval: float | None = 5.0, skip_none=True, append=True):
+        super().__init__(path, batch_size, flush_interval, skip_none, append)
+        self.fieldnames = fieldnames
+        self._writer = None
+
+    def _write_batch(self, batch: list):
+        if self._writer is None:
+            if isinstance(batch[0], dict):
+                self.fieldnames = self.fieldnames or list(batch[0])
+                self._writer = csv.DictWriter(self._file, self.fieldnames, extrasaction='ignore')
+                if self._file.tell() == 0:
+                    self._writer.writeheader()
+            else:
+                self._writer = csv.writer(self._file)
+                if self.fieldnames and self._file.tell() == 0:
+                    self._writer.writerow(self.fieldnames)
+
+        if isinstance(self._writer, csv.DictWriter):
+            self._writer.writerows(batch)
+        else:
+            self._writer.writerows(x if isinstance(x, (list, tuple)) else (x,) for x in batch)
+        self._file.flush()
+
+
+class SqliteSink(ResultSink):
+    """
+    Results are inserted to table by batches in one transaction.
+    Columns are taken from keys of first dict result, sequences are inserted by position,
+    other values to 'value' column. Table is created if it does not exist.
+    Not scalar values are stored as JSON.
+    """
+
+    def __init__(self, path: str, table='results', columns: Sequence[str] | None = None, batch_size=1000,
+                 flush_interval: float | None = 5.0, skip_none=True):
+        super().__init__(batch_size, flush_interval, skip_none)
+        self.path = path
+        self.table = table
+        self.columns = list(columns) if columns else None
+        self._connection = None
+
+    async def open(self):
+        await super().open()
+        self._connection = await asyncio.to_thread(sqlite3.connect, self.path, check_same_thread=False)
+
+    async def write(self, batch: list):
+        await asyncio.to_thread(self._write_batch, batch)
+
+    def _write_batch(self, batch: list):
+        first = batch[0]
+        if self.columns is None:
+            if isinstance(first, dict):
+                self.columns = list(first)
+            elif isinstance(first, (list, tuple)):
+                self.columns = [f'c{i}' for i in range(len(first))]
+            else:
+                self.columns = ['value']
+
+        columns = ', '.join(f'"{x}"' for x in self.columns)
+        placeholders = ', '.join('?' * len(self.columns))
+        with self._connection:
+            self._connection.execute(f'CREATE TABLE IF NOT EXISTS "{self.table}" ({columns})')
+            self._connection.executemany(f'INSERT INTO "{self.table}" ({columns}) VALUES ({placeholders})',
+                                         (self._get_row(x) for x in batch))
+
+    def _get_row(self, item) -> tuple:
+        if isinstance(item, dict):
+            values = (item.get(x) for x in self.columns)
+        elif isinstance(item, (list, tuple)):
+            values = item
+        else:
+            values = (item,)
+        return tuple(x if x is None or isinstance(x, (str, int, float, bytes)) else
+                     json.dumps(x, ensure_ascii=False, default=str) for x in values)
+
+    async def _close(self):
+        if self._connection is not None:
+            await asyncio.to_thread(self._connection.close)
+            self._connection = None
+
+
+class CallbackSink(ResultSink):
+    """Batches are passed to sync or async callback(batch)"""
+
+    def __init__(self, callback: Callable[[list], Any | Awaitable[Any]], batch_size=100,
+                 flush_interval: float | None = 5.0, skip_none=True):
+        super().__init__(batch_size, flush_interval, skip_none)
+        self.callback = callback
+
+    async def write(self, batch: list):
+        result = self.callback(batch)
+        if inspect.isawaitable(result):
+            await result
@@ -0,0 +1,56 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+
+class SqliteStore:
+    """
+    Base of persistent stores in SQLite database (WAL mode), shared between threads and processes.
+    Every process opens own connection, all queries are made under one lock.
+    SCHEMA - queries creating tables and indexes.
+    """
+
+    SCHEMA: tuple[str, ...] = ()
+
+    def __init__(self, path: str):
+        self.path = path
+        self._connection = None
+        self._pid = None
+        self._lock = threading.RLock()
+
+    def _create_connection(self) -> sqlite3.Connection:
+        folder = os.path.dirname(self.path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        for query in self.SCHEMA:
+            connection.execute(query)
+        return connection
+
+    @contextmanager
+    def _db(self):
+        """Connection of current process under lock"""
+
+        with self._lock:
+            if self._connection is None or self._pid != os.getpid():
+                self._connection = self._create_connection()
+                self._pid = os.getpid()
+            yield self._connection
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None and self._pid == os.getpid():
+                self._connection.close()
+            self._connection = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.update(_connection=None, _pid=None, _lock=None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.RLock()
@@ -0,0 +1,232 @@
+import asyncio
+import json
+import sys
+import threading
+import time
+import traceback
+import types
+from typing import Any, Callable, Coroutine, NamedTuple
+
+from .metrics import Histogram
+
+CPU_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class SlowCallback(NamedTuple):
+    """Callback (or other code, if url is None), which blocked event loop longer than threshold"""
+
+    url: str | None
+    callback: str | None
+    duration: float
+    stack: list[str] | None
+
+    def to_dict(self) -> dict:
+        return self._asdict() | {'duration': round(self.duration, 6)}
+
+
+class _Step:
+    __slots__ = ('url', 'callback', 'start', 'stack')
+
+    def __init__(self, url, callback, start):
+        self.url = url
+        self.callback = callback
+        self.start = start
+        self.stack = None
+
+
+class LoopWatchdog:
+    """
+    Watchdog of event loop.
+    Heartbeat task measures loop lag, sampling thread takes stack of loop thread,
+    when loop is blocked longer than threshold.
+    Every synchronous step of tracked callbacks is timed: steps longer than threshold
+    are reported as SlowCallback with url and stack sample, CPU time of every call is added
+    to histogram of callback.
+    on_slow(SlowCallback) is called for every slow callback (message is printed by default).
+    If path is set, report is written to JSON file at the end of run.
+    """
+
+    def __init__(self, threshold=0.1, interval=0.05, sample_stacks=True,
+                 on_slow: Callable[[SlowCallback], Any] | None = None, path: str | None = None,
+                 max_reports: int | None = 1000):
+        self.threshold = threshold
+        self.interval = interval
+        self.sample_stacks = sample_stacks
+        self.on_slow = on_slow if on_slow is not None else self._print_slow
+        self.path = path
+        self.max_reports = max_reports
+        self.reset()
+
+        self._loop = None
+        self._loop_thread_id = None
+        self._heartbeat_task = None
+        self._sampler = None
+        self._stop = threading.Event()
+        self._beat = 0.0
+        self._blocked: _Step | None = None
+        self._current: _Step | None = None
+
+    def reset(self):
+        self.loop_lag = Histogram()
+        self.max_lag = 0.0
+        self.slow_callbacks: list[SlowCallback] = []
+        self.slow_count = 0
+        self.cpu_time: dict[str, Histogram] = {}
+
+    def start(self):
+        """Starting of watchdog in running loop, does nothing if it is already started in this loop"""
+
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+        self.stop(write=False)
+        self._loop = loop
+        self._loop_thread_id = threading.get_ident()
+        self._beat = time.perf_counter()
+        self._heartbeat_task = loop.create_task(self._heartbeat())
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(target=self._sample, name='LoopWatchdog', daemon=True)
+        self._sampler.start()
+
+    def stop(self, write=True):
+        if self._heartbeat_task is not None:
+            try:
+                self._heartbeat_task.cancel()
+            except RuntimeError:
+                # Loop is already closed
+                pass
+            self._heartbeat_task = None
+        if self._sampler is not None:
+            self._stop.set()
+            self._sampler.join()
+            self._sampler = None
+        self._loop = None
+        if write and self.path:
+            self.write()
+
+    async def _heartbeat(self):
+        while True:
+            start = time.perf_counter()
+            self._beat = start
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.perf_counter() - start - self.interval)
+            self.loop_lag.observe(lag)
+            self.max_lag = max(self.max_lag, lag)
+
+            blocked, self._blocked = self._blocked, None
+            if blocked is not None and lag > self.threshold:
+                self._add_slow(SlowCallback(None, None, lag, blocked.stack))
+
+    def _sample(self):
+        """Thread taking stack samples of blocked loop"""
+
+        while not self._stop.wait(self.interval / 2):
+            now = time.perf_counter()
+            step = self._current
+            if step is not None:
+                if step.stack is None and now - step.start > self.threshold:
+                    step.stack = self._get_stack()
+            elif self._blocked is None and now - self._beat > self.interval + self.threshold:
+                blocked = _Step(None, None, self._beat)
+                blocked.stack = self._get_stack()
+                self._blocked = blocked
+
+    def _get_stack(self) -> list[str] | None:
+        if not self.sample_stacks:
+            return None
+        frame = sys._current_frames().get(self._loop_thread_id)
+        return traceback.format_stack(frame) if frame is not None else None
+
+    def track(self, url: str | None, coro: Coroutine, callback: Callable | None = None):
+        """Awaitable running coro with timing of its steps"""
+
+        self.start()
+        name = getattr(callback, '__qualname__', None) or getattr(coro, '__qualname__', None) or repr(callback)
+        return self._run_steps(url, name, coro)
+
+    @types.coroutine
+    def _run_steps(self, url, name, coro):
+        iterator = coro.__await__()
+        cpu_time = 0.0
+        value, error = None, None
+        try:
+            while True:
+                step = _Step(url, name, time.perf_counter())
+                self._current = step
+                cpu_start = time.thread_time()
+                try:
+                    if error is None:
+                        signal = iterator.send(value)
+                    else:
+                        signal = iterator.throw(error)
+                except StopIteration as e:
+                    return e.value
+                finally:
+                    self._current = None
+                    cpu_time += time.thread_time() - cpu_start
+                    duration = time.perf_counter() - step.start
+                    if duration > self.threshold:
+                        self._add_slow(SlowCallback(url, name, duration, step.stack))
+                        # Loop lag of this block is already reported
+                        self._blocked = None
+
+                value, error = None, None
+                try:
+                    value = yield signal
+                except GeneratorExit:
+                    iterator.close()
+                    raise
+                except BaseException as e:
+                    error = e
+        finally:
+            if name not in self.cpu_time:
+                self.cpu_time[name] = Histogram(CPU_BUCKETS)
+            self.cpu_time[name].observe(cpu_time)
+
+    def _add_slow(self, slow: SlowCallback):
+        self.slow_count += 1
+        if self.max_reports is None or len(self.slow_callbacks) < self.max_reports:
+            self.slow_callbacks.append(slow)
+        self.on_slow(slow)
+
+    @staticmethod
+    def _print_slow(slow: SlowCallback):
+        where = f'{slow.callback} ({slow.url})' if slow.callback else 'Event loop'
+        line = slow.stack[-1].strip().splitlines()[0] if slow.stack else ''
+        print(f'{where} blocked event loop for {slow.duration:.3f}s {line}'.rstrip())
+
+    def merge(self, other: 'LoopWatchdog'):
+        """Adding of data collected by other watchdog, for example in worker process"""
+
+        self.loop_lag.merge(other.loop_lag)
+        self.max_lag = max(self.max_lag, other.max_lag)
+        self.slow_count += other.slow_count
+        free = None if self.max_reports is None else max(self.max_reports - len(self.slow_callbacks), 0)
+        self.slow_callbacks.extend(other.slow_callbacks[:free])
+        for name, histogram in other.cpu_time.items():
+            if name not in self.cpu_time:
+                self.cpu_time[name] = Histogram(histogram.buckets)
+            self.cpu_time[name].merge(histogram)
+
+    def report(self) -> dict:
+        return {
+            'loop_lag': self.loop_lag.to_dict(),
+            'max_lag': round(self.max_lag, 6),
+            'slow_count': self.slow_count,
+            'slow_callbacks': [x.to_dict() for x in self.slow_callbacks],
+            'cpu_time': {name: x.to_dict() for name, x in self.cpu_time.items()},
+        }
+
+    def write(self, path: str | None = None):
+        with open(path or self.path, 'w', encoding='utf-8') as f:
+            json.dump(self.report(), f, indent=2, ensure_ascii=False)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.update(_loop=None, _heartbeat_task=None, _sampler=None, _stop=None, _blocked=None, _current=None,
+                     path=None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._stop = threading.Event()
@@ -0,0 +1,300 @@
+"""
+Benchmarks of runners against local server.
+
+    python benchmarks/run_benchmarks.py --runners engine,requests,downloader --concurrency 10,100,500
+    python benchmarks/run_benchmarks.py --hosts-config hosts.json --compare benchmarks/results/old.json
+
+hosts.json - list of host settings: [{"latency": 0.01, "size": 2048, "error_rate": 0.01}, {"latency": 0.5}]
+Every scenario is run in a new process to measure its peak RSS.
+Results are saved to JSON (benchmarks/results/<time>.json by default).
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from async_parse_tools import AsyncBase, AsyncDownloader, AsyncRequests  # noqa: E402
+from server import HostBehaviour, start_servers  # noqa: E402
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+def percentile(values: list[float], p: float) -> float | None:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def get_peak_rss_mb() -> float | None:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 ** 2 if sys.platform == 'darwin' else 1024), 1)
+
+
+class LoopLagMonitor:
+    """Measuring of event loop lag as delay of wake up of sleeping task"""
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.lags = []
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            self.lags.append(max(0.0, loop.time() - start - self.interval))
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+
+class EngineRunner(AsyncBase):
+    """Task engine only: tasks are sleeps with latency of server"""
+
+    def __init__(self, connections_limit, latencies: list[float]):
+        super().__init__()
+        self.connections_limit = connections_limit
+        self.latencies = latencies
+
+    def run(self, count, latency):
+        return asyncio.run(self.run_async(count, latency))
+
+    async def run_async(self, count, latency):
+        async def task():
+            start = time.perf_counter()
+            await asyncio.sleep(latency)
+            self.latencies.append(time.perf_counter() - start)
+            return latency
+
+        return await self._start_tasks_limited((task() for _ in range(count)), limit=self.connections_limit)
+
+
+class TimedRequests(AsyncRequests):
+    def __init__(self, connections_limit, latencies: list[float]):
+        super().__init__(connections_limit=connections_limit)
+        self.latencies = latencies
+
+    async def _fetch(self, session, url, request_kwargs):
+        start = time.perf_counter()
+        try:
+            return await super()._fetch(session, url, request_kwargs)
+        finally:
+            self.latencies.append(time.perf_counter() - start)
+
+
+class TimedDownloader(AsyncDownloader):
+    def __init__(self, connections_limit, latencies: list[float]):
+        super().__init__(connections_limit=connections_limit, skip_checking=True)
+        self.latencies = latencies
+
+    async def _start_download(self, session, url, filepath):
+        start = time.perf_counter()
+        try:
+            return await super()._start_download(session, url, filepath)
+        finally:
+            self.latencies.append(time.perf_counter() - start)
+
+
+async def parse(url, r: bytes, session):
+    return len(r)
+
+
+def get_urls(base_urls: list[str], count: int):
+    return (f'{base_urls[i % len(base_urls)]}/item/{i}' for i in range(count))
+
+
+async def run_scenario_async(options: dict) -> dict:
+    latencies = []
+    name, concurrency, count = options['runner'], options['concurrency'], options['count']
+    folder = None
+
+    if name == 'engine':
+        runner = EngineRunner(concurrency, latencies)
+        call = runner.run_async(count, options['hosts'][0]['latency'])
+    elif name == 'requests':
+        runner = TimedRequests(concurrency, latencies)
+        call = runner.run_async(get_urls(options['base_urls'], count), parse)
+    elif name == 'downloader':
+        runner = TimedDownloader(concurrency, latencies)
+        folder = tempfile.mkdtemp(prefix='async-parse-bench-')
+        call = runner.run_async(get_urls(options['base_urls'], count), folder)
+    else:
+        raise ValueError(f'Unknown runner: {name}')
+
+    runner.visuals_settings(use_statusbar=False, print_errors_string=False)
+    runner.error_settings(max_tries=options['max_tries'], error_wait_time=0)
+    if options['limit_per_host'] and name != 'engine':
+        runner.host_settings(limit_per_host=options['limit_per_host'])
+
+    monitor = LoopLagMonitor()
+    monitor.start()
+    start = time.perf_counter()
+    try:
+        await call
+    finally:
+        elapsed = time.perf_counter() - start
+        await monitor.stop()
+        if folder:
+            shutil.rmtree(folder, ignore_errors=True)
+
+    def ms(value):
+        return None if value is None else round(value * 1000, 2)
+
+    return {
+        'runner': name,
+        'concurrency': concurrency,
+        'count': count,
+        'errors': runner.errors.total,
+        'elapsed': round(elapsed, 3),
+        'rps': round(count / elapsed, 1),
+        'latency_ms': {p: ms(percentile(latencies, int(p[1:]))) for p in ('p50', 'p90', 'p99')}
+                      | {'max': ms(max(latencies, default=None))},
+        'loop_lag_ms': {'p50': ms(percentile(monitor.lags, 50)), 'p99': ms(percentile(monitor.lags, 99)),
+                        'max': ms(max(monitor.lags, default=None))},
+        'peak_rss_mb': get_peak_rss_mb(),
+    }
+
+
+def run_scenario(options: dict, queue):
+    try:
+        queue.put(asyncio.run(run_scenario_async(options)))
+    except BaseException as e:
+        queue.put({'runner': options['runner'], 'concurrency': options['concurrency'],
+                   'error': f'{e.__class__.__name__}: {e}'})
+
+
+def run_in_process(options: dict) -> dict:
+    """Scenario is run in new process, so peak RSS belongs only to it"""
+
+    context = multiprocessing.get_context('spawn')
+    queue = context.Queue()
+    process = context.Process(target=run_scenario, args=(options, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def get_commit() -> str | None:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: list[dict], previous_path: str):
+    with open(previous_path, encoding='utf-8') as f:
+        previous = {(x['runner'], x['concurrency']): x for x in json.load(f)['results'] if 'error' not in x}
+
+    print(f'\nComparison with {previous_path}:')
+    for result in results:
+        old = previous.get((result['runner'], result['concurrency']))
+        if old is None or 'error' in result:
+            continue
+        change = (result['rps'] - old['rps']) / old['rps'] * 100 if old['rps'] else 0.0
+        print(f"{result['runner']:>10} x{result['concurrency']:<5} rps {old['rps']:>9} -> {result['rps']:>9} "
+              f"({change:+.1f}%), p99 {old['latency_ms']['p99']} -> {result['latency_ms']['p99']} ms")
+
+
+def print_result(result: dict):
+    if 'error' in result:
+        print(f"{result['runner']:>10} x{result['concurrency']:<5} failed: {result['error']}")
+        return
+    print(f"{result['runner']:>10} x{result['concurrency']:<5} {result['rps']:>9} rps, "
+          f"p50 {result['latency_ms']['p50']} ms, p99 {result['latency_ms']['p99']} ms, "
+          f"lag p99 {result['loop_lag_ms']['p99']} ms, rss {result['peak_rss_mb']} MB, errors {result['errors']}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmarks of async_parse_tools runners')
+    parser.add_argument('--runners', default='engine,requests,downloader')
+    parser.add_argument('--concurrency', default='10,100,500', help='comma separated connections limits')
+    parser.add_argument('--count', type=int, default=5000, help='number of urls in every scenario')
+    parser.add_argument('--hosts', type=int, default=1, help='number of hosts with the same settings')
+    parser.add_argument('--hosts-config', help='JSON file with list of settings of every host')
+    parser.add_argument('--latency', type=float, default=0.01)
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--size', type=int, default=2048)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--max-tries', type=int, default=1)
+    parser.add_argument('--limit-per-host', type=int, default=0)
+    parser.add_argument('--port', type=int, default=8900)
+    parser.add_argument('--output', help='path of JSON results')
+    parser.add_argument('--compare', help='JSON results of previous run to compare with')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.hosts_config:
+        with open(args.hosts_config, encoding='utf-8') as f:
+            hosts = [HostBehaviour(**x) for x in json.load(f)]
+    else:
+        hosts = [HostBehaviour(args.latency, args.jitter, args.size, args.error_rate)] * args.hosts
+
+    process, base_urls = start_servers(hosts, port=args.port)
+    results = []
+    try:
+        for runner in args.runners.split(','):
+            for concurrency in map(int, args.concurrency.split(',')):
+                options = dict(runner=runner.strip(), concurrency=concurrency, count=args.count,
+                               base_urls=base_urls, hosts=[x._asdict() for x in hosts],
+                               max_tries=args.max_tries, limit_per_host=args.limit_per_host)
+                result = run_in_process(options)
+                print_result(result)
+                results.append(result)
+    finally:
+        process.terminate()
+
+    output = args.output or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results',
+                                         datetime.now().strftime('%Y%m%d-%H%M%S') + '.json')
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump({
+            'meta': {
+                'time': datetime.now().isoformat(timespec='seconds'),
+                'commit': get_commit(),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'cpu_count': os.cpu_count(),
+                'hosts': [x._asdict() for x in hosts],
+                'limit_per_host': args.limit_per_host,
+                'max_tries': args.max_tries,
+            },
+            'results': results,
+        }, f, indent=2)
+    print(f'Results are saved to {output}')
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Local HTTP server for benchmarks.
+Every host is served on its own port with own latency, body size and error rate,
+so per host limits of runners can be measured too.
+Query parameters size, latency and error_rate override settings of host for one request.
+"""
+
+import asyncio
+import multiprocessing
+import random
+from typing import NamedTuple
+
+from aiohttp import web
+
+
+class HostBehaviour(NamedTuple):
+    latency: float = 0.01
+    jitter: float = 0.0
+    size: int = 2048
+    error_rate: float = 0.0
+    error_status: int = 503
+
+
+def make_app(behaviour: HostBehaviour) -> web.Application:
+    bodies = {}
+
+    def get_body(size: int) -> bytes:
+        if size not in bodies:
+            bodies[size] = random.randbytes(size)
+        return bodies[size]
+
+    async def item(request: web.Request):
+        query = request.query
+        latency = float(query.get('latency', behaviour.latency))
+        if behaviour.jitter:
+            latency = max(0.0, latency + random.uniform(-behaviour.jitter, behaviour.jitter))
+        if latency:
+            await asyncio.sleep(latency)
+
+        if random.random() < float(query.get('error_rate', behaviour.error_rate)):
+            return web.Response(status=behaviour.error_status, text='error')
+
+        body = get_body(int(query.get('size', behaviour.size)))
+        return web.Response(body=body, headers={'ETag': f'"{len(body)}"'})
+
+    app = web.Application()
+    app.router.add_get('/item/{name}', item)
+    return app
+
+
+async def _serve(hosts: list[HostBehaviour], host: str, port: int, ready):
+    runners = []
+    for i, behaviour in enumerate(hosts):
+        runner = web.AppRunner(make_app(behaviour), access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, host, port + i, backlog=4096).start()
+        runners.append(runner)
+    ready.set()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        for runner in runners:
+            await runner.cleanup()
+
+
+def serve(hosts: list[HostBehaviour], host='127.0.0.1', port=8900, ready=None):
+    """Running of servers of all hosts in current process"""
+
+    ready = ready or multiprocessing.Event()
+    asyncio.run(_serve(hosts, host, port, ready))
+
+
+def start_servers(hosts: list[HostBehaviour], host='127.0.0.1', port=8900):
+    """Starting of servers in separate process. Returns process and base urls of hosts"""
+
+    ready = multiprocessing.Event()
+    process = multiprocessing.Process(target=serve, args=(hosts, host, port, ready), daemon=True)
+    process.start()
+    if not ready.wait(30):
+        process.terminate()
+        raise RuntimeError('Benchmark server was not started')
+    return process, [f'http://{host}:{port + i}' for i in range(len(hosts))]
@@ -12,7 +12,6 @@ setup(name='async-parse-tools',
           'aiohttp~=3.13.3',
           'aiofile~=3.9.0',
           'tqdm~=4.67.1',
-          'asyncio-pool~=0.6.0',
       ],
       extras_require={
           "pw": [
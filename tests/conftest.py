@@ -0,0 +1,94 @@
+import asyncio
+import re
+import threading
+from types import SimpleNamespace
+
+import pytest
+from aiohttp import web
+
+BODY = bytes(range(256)) * 64
+
+
+def make_app(state: SimpleNamespace) -> web.Application:
+    """Test server: pages, failing pages, answers with given status, file with Range support and page with ETag"""
+
+    async def record(request: web.Request):
+        state.requests.append((request.path, dict(request.headers)))
+
+    async def text(request: web.Request):
+        await record(request)
+        return web.Response(text='hello ' + request.match_info['name'])
+
+    async def fail(request: web.Request):
+        """Answers 503 first fails times for every name"""
+
+        await record(request)
+        name = request.match_info['name']
+        state.failures[name] = state.failures.get(name, 0) + 1
+        if state.failures[name] <= state.fails:
+            return web.Response(status=503, text='error')
+        return web.Response(text='ok ' + name)
+
+    async def status(request: web.Request):
+        await record(request)
+        return web.Response(status=int(request.match_info['code']))
+
+    async def file(request: web.Request):
+        await record(request)
+        body, etag = state.file_body, state.file_etag
+        headers = {'ETag': etag, 'Accept-Ranges': 'bytes'}
+        match = re.match(r'bytes=(\d+)-$', request.headers.get('Range', ''))
+        if match and request.headers.get('If-Range') == etag:
+            start = int(match.group(1))
+            if start >= len(body):
+                return web.Response(status=416, headers={'Content-Range': f'bytes */{len(body)}'})
+            headers['Content-Range'] = f'bytes {start}-{len(body) - 1}/{len(body)}'
+            return web.Response(status=206, body=body[start:], headers=headers)
+        return web.Response(body=body, headers=headers)
+
+    async def cached(request: web.Request):
+        await record(request)
+        etag = '"v1"'
+        if request.headers.get('If-None-Match') == etag:
+            return web.Response(status=304, headers={'ETag': etag})
+        return web.Response(body=b'cached ' + request.match_info['name'].encode(), headers={'ETag': etag})
+
+    app = web.Application()
+    app.router.add_get('/text/{name}', text)
+    app.router.add_get('/fail/{name}', fail)
+    app.router.add_get('/status/{code}', status)
+    app.router.add_get('/file/{name}', file)
+    app.router.add_get('/cached/{name}', cached)
+    return app
+
+
+@pytest.fixture(scope='session')
+def _server():
+    state = SimpleNamespace()
+    loop = asyncio.new_event_loop()
+    runner = web.AppRunner(make_app(state), access_log=None)
+    loop.run_until_complete(runner.setup())
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    loop.run_until_complete(site.start())
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+
+    state.url = 'http://127.0.0.1:{}'.format(runner.addresses[0][1])
+    yield state
+
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    loop.run_until_complete(runner.cleanup())
+    loop.close()
+
+
+@pytest.fixture
+def server(_server):
+    """Server with state reset before every test"""
+
+    _server.requests = []
+    _server.failures = {}
+    _server.fails = 0
+    _server.file_body = BODY
+    _server.file_etag = '"file-v1"'
+    return _server
@@ -0,0 +1,85 @@
+import json
+import os
+
+from async_parse_tools import AsyncDownloader
+
+from conftest import BODY
+
+
+def make_downloader():
+    return (AsyncDownloader(skip_checking=True)
+            .visuals_settings(use_statusbar=False, print_errors_string=False)
+            .error_settings(max_tries=1, error_wait_time=0))
+
+
+def write_part(folder, url, data: bytes, validator='"file-v1"'):
+    filepath = folder / 'data.bin'
+    (folder / 'data.bin.part').write_bytes(data)
+    (folder / 'data.bin.part.json').write_text(json.dumps({'url': url, 'validator': validator}))
+    return filepath
+
+
+def assert_finished(folder):
+    assert (folder / 'data.bin').read_bytes() == BODY
+    assert not os.path.exists(folder / 'data.bin.part')
+    assert not os.path.exists(folder / 'data.bin.part.json')
+
+
+def test_download(server, tmp_path):
+    url = f'{server.url}/file/data.bin'
+    result = make_downloader().run([url], str(tmp_path))
+    assert result == ((url, os.path.join(str(tmp_path), 'data.bin')),)
+    assert_finished(tmp_path)
+    assert 'Range' not in server.requests[0][1]
+
+
+def test_resume_with_206(server, tmp_path):
+    url = f'{server.url}/file/data.bin'
+    write_part(tmp_path, url, BODY[:1000])
+
+    make_downloader().run([url], str(tmp_path))
+    assert_finished(tmp_path)
+    headers = server.requests[0][1]
+    assert headers['Range'] == 'bytes=1000-'
+    assert headers['If-Range'] == '"file-v1"'
+
+
+def test_complete_part_with_416(server, tmp_path):
+    url = f'{server.url}/file/data.bin'
+    write_part(tmp_path, url, BODY)
+
+    make_downloader().run([url], str(tmp_path))
+    assert_finished(tmp_path)
+    assert headers_range(server) == f'bytes={len(BODY)}-'
+
+
+def test_changed_file_is_loaded_again_with_200(server, tmp_path):
+    url = f'{server.url}/file/data.bin'
+    write_part(tmp_path, url, b'old content', validator='"file-v0"')
+
+    make_downloader().run([url], str(tmp_path))
+    assert_finished(tmp_path)
+    assert headers_range(server) == f'bytes={len(b"old content")}-'
+
+
+def test_part_of_other_url_is_not_resumed(server, tmp_path):
+    url = f'{server.url}/file/data.bin'
+    write_part(tmp_path, url + '?other', BODY[:1000])
+
+    make_downloader().run([url], str(tmp_path))
+    assert_finished(tmp_path)
+    assert headers_range(server) is None
+
+
+def test_unreadable_resume_info(server, tmp_path):
+    url = f'{server.url}/file/data.bin'
+    write_part(tmp_path, url, BODY[:1000])
+    (tmp_path / 'data.bin.part.json').write_text('{"url": ')
+
+    make_downloader().run([url], str(tmp_path))
+    assert_finished(tmp_path)
+    assert headers_range(server) is None
+
+
+def headers_range(server):
+    return server.requests[-1][1].get('Range')
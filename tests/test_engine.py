@@ -0,0 +1,107 @@
+import asyncio
+import random
+
+import pytest
+
+from async_parse_tools import AsyncRequests
+
+
+def make_runner():
+    return AsyncRequests().visuals_settings(use_statusbar=False)
+
+
+class Counter:
+    def __init__(self):
+        self.active = 0
+        self.peak = 0
+        self.started = 0
+
+    async def task(self, value):
+        self.started += 1
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await asyncio.sleep(random.uniform(0, 0.005))
+            return value
+        finally:
+            self.active -= 1
+
+
+def sync_source(counter, n):
+    return (counter.task(i) for i in range(n))
+
+
+async def async_source(counter, n):
+    for i in range(n):
+        await asyncio.sleep(0)
+        yield counter.task(i)
+
+
+@pytest.mark.parametrize('source', [sync_source, async_source])
+@pytest.mark.parametrize('ordered', [True, False])
+def test_results_and_limit(source, ordered):
+    counter = Counter()
+
+    async def main():
+        runner = make_runner()
+        return [x async for x in runner._iter_tasks_limited(source(counter, 200), limit=7, ordered=ordered)]
+
+    results = asyncio.run(main())
+    if ordered:
+        assert results == list(range(200))
+    else:
+        assert sorted(results) == list(range(200))
+    assert counter.peak <= 7
+
+
+@pytest.mark.parametrize('source', [sync_source, async_source])
+def test_source_is_pulled_lazily(source):
+    counter = Counter()
+
+    async def main():
+        runner = make_runner()
+        results = runner._iter_tasks_limited(source(counter, 10 ** 6), limit=5, ordered=True)
+        first = [await anext(results) for _ in range(10)]
+        await results.aclose()
+        return first
+
+    first = asyncio.run(main())
+    assert first == list(range(10))
+    # Only tasks within reorder window are started
+    assert counter.started <= 10 + 5 * 4
+
+
+@pytest.mark.parametrize('source', [sync_source, async_source])
+def test_unordered_results_are_yielded_as_completed(source):
+    async def slow(value, delay):
+        await asyncio.sleep(delay)
+        return value
+
+    def tasks():
+        yield slow('slow', 0.2)
+        for i in range(3):
+            yield slow(i, 0)
+
+    async def async_tasks():
+        for task in tasks():
+            yield task
+
+    async def main():
+        runner = make_runner()
+        items = tasks() if source is sync_source else async_tasks()
+        return [x async for x in runner._iter_tasks_limited(items, limit=4, ordered=False)]
+
+    assert asyncio.run(main())[-1] == 'slow'
+
+
+def test_error_of_async_source_is_raised():
+    async def broken():
+        yield asyncio.sleep(0, 'first')
+        raise ValueError('broken source')
+
+    async def main():
+        runner = make_runner()
+        return [x async for x in runner._iter_tasks_limited(broken(), limit=2)]
+
+    with pytest.raises(ValueError, match='broken source'):
+        asyncio.run(main())
@@ -0,0 +1,68 @@
+from async_parse_tools import AsyncRequests, HttpCache
+
+
+async def text(url, r, session):
+    return r.decode()
+
+
+def make_runner(cache, **kwargs):
+    return AsyncRequests().visuals_settings(use_statusbar=False).set_cache(cache, **kwargs)
+
+
+def test_304_is_replayed_from_cache(server, tmp_path):
+    path = str(tmp_path / 'cache.db')
+    urls = [f'{server.url}/cached/{i}' for i in range(3)]
+
+    assert make_runner(path).run(urls, text) == [f'cached {i}' for i in range(3)]
+    assert all('If-None-Match' not in headers for _, headers in server.requests)
+
+    server.requests.clear()
+    assert make_runner(path).run(urls, text) == [f'cached {i}' for i in range(3)]
+    assert [headers.get('If-None-Match') for _, headers in server.requests] == ['"v1"'] * 3
+
+
+def test_fresh_entries_are_returned_without_requests(server, tmp_path):
+    path = str(tmp_path / 'cache.db')
+    urls = [f'{server.url}/cached/{i}' for i in range(3)]
+
+    make_runner(path, ttl=60).run(urls, text)
+    server.requests.clear()
+    assert make_runner(path, ttl=60).run(urls, text) == [f'cached {i}' for i in range(3)]
+    assert server.requests == []
+
+
+def test_eviction(tmp_path):
+    cache = HttpCache(str(tmp_path / 'cache.db'), max_size=1000)
+    for i in range(5):
+        cache.set(str(i), f'url{i}', b'x' * 300)
+    # Least recently used entries are removed as soon as size is exceeded
+    assert [cache.get(str(i)) is not None for i in range(5)] == [False, False, True, True, True]
+
+    cache.get('2')
+    cache.set('5', 'url5', b'x' * 300)
+    assert [cache.get(str(i)) is not None for i in range(2, 6)] == [True, False, True, True]
+
+    # Replacing of entry counts only its new size
+    cache.set('5', 'url5', b'x' * 10)
+    cache.set('6', 'url6', b'x' * 100)
+    assert [cache.get(str(i)) is not None for i in range(2, 7)] == [True, False, True, True, True]
+    cache.close()
+
+
+def test_eviction_at_the_end_of_run(server, tmp_path):
+    path = str(tmp_path / 'cache.db')
+    # Cache is filled by other process with larger max_size
+    other = HttpCache(path)
+    for i in range(10):
+        other.set(f'other{i}', 'url', b'x' * 100)
+    other.close()
+
+    urls = [f'{server.url}/cached/{i}' for i in range(2)]
+    runner = make_runner(path, max_size=500)
+    runner.run(urls, text)
+
+    cache = HttpCache(path)
+    with cache._db() as connection:
+        assert connection.execute('SELECT SUM(size) FROM responses').fetchone()[0] <= 500
+    assert runner.cache._connection is None
+    cache.close()
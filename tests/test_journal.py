@@ -0,0 +1,56 @@
+from async_parse_tools import AsyncRequests, Journal
+
+
+async def text(url, r, session):
+    return r.decode()
+
+
+def make_runner(path, **kwargs):
+    return (AsyncRequests().visuals_settings(use_statusbar=False, print_errors_string=False)
+            .error_settings(max_tries=1, error_wait_time=0)
+            .set_journal(str(path), **kwargs))
+
+
+def test_states(tmp_path):
+    journal = Journal(str(tmp_path / 'journal.db'), store_results=True, batch_size=2)
+    journal.mark_started('a')
+    journal.mark_done('b', {'value': 1})
+    journal.mark_failed('c', 'error')
+    # Buffered states are visible before writing
+    assert journal.get('a') == (Journal.STARTED, None)
+    journal.close()
+
+    journal = Journal(str(tmp_path / 'journal.db'), retry_failed=True)
+    assert journal.should_skip('a') == (False, None)
+    assert journal.should_skip('b') == (True, {'value': 1})
+    assert journal.should_skip('c') == (False, None)
+    assert journal.should_skip('d') == (False, None)
+    assert journal.skipped == 1
+    assert journal.counts() == {Journal.STARTED: 1, Journal.DONE: 1, Journal.FAILED: 1}
+
+    journal.retry_failed = False
+    assert journal.should_skip('c') == (True, None)
+    journal.close()
+
+
+def test_resume_of_run(server, tmp_path):
+    path = tmp_path / 'journal.db'
+    urls = [f'{server.url}/text/{i}' for i in range(5)] + [f'{server.url}/status/500']
+
+    runner = make_runner(path, store_results=True)
+    assert runner.run(urls, text) == [f'hello {i}' for i in range(5)] + [None]
+    assert len(server.requests) == 6
+
+    # Done items are skipped with stored results, failed item is loaded again
+    server.requests.clear()
+    runner = make_runner(path, store_results=True)
+    assert runner.run(urls, text) == [f'hello {i}' for i in range(5)] + [None]
+    assert [x for x, _ in server.requests] == ['/status/500']
+    assert runner.journal.skipped == 5
+
+    server.requests.clear()
+    runner = make_runner(path, retry_failed=False)
+    runner.return_stats = True
+    stats = runner.run(urls, text)
+    assert server.requests == []
+    assert (stats.items, stats.skipped) == (6, 6)
@@ -0,0 +1,75 @@
+import asyncio
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+
+import aiohttp
+import pytest
+from multidict import CIMultiDict
+
+from async_parse_tools import AsyncRequests, RetryPolicy
+from async_parse_tools.retry import parse_retry_after
+
+
+def response_error(status, headers=None):
+    return aiohttp.ClientResponseError(None, (), status=status, headers=CIMultiDict(headers or {}))
+
+
+@pytest.mark.parametrize('error, retryable', [
+    (response_error(503), True),
+    (response_error(429), True),
+    (response_error(500), True),
+    (response_error(404), False),
+    (response_error(403), False),
+    (aiohttp.ServerDisconnectedError(), True),
+    (aiohttp.ClientConnectionError(), True),
+    (asyncio.TimeoutError(), True),
+    (ValueError('parse error'), False),
+])
+def test_default_classification(error, retryable):
+    assert RetryPolicy().is_retryable(error) is retryable
+
+
+def test_fixed_policy_retries_any_error():
+    policy = RetryPolicy.fixed(max_tries=3, wait_time=1)
+    assert policy.get_delay(ValueError(), 1) == 1
+    assert policy.get_delay(response_error(404), 2) == 1
+    assert policy.get_delay(ValueError(), 3) is None
+
+
+def test_backoff_is_limited():
+    policy = RetryPolicy(max_tries=10, backoff=1, factor=2, max_backoff=5, jitter=0)
+    assert [policy.get_delay(response_error(503), n) for n in range(1, 6)] == [1, 2, 4, 5, 5]
+
+
+def test_retry_after():
+    policy = RetryPolicy(backoff=0.1, jitter=0, max_retry_after=60)
+    assert policy.get_delay(response_error(429, {'Retry-After': '7'}), 1) == 7
+    assert policy.get_delay(response_error(503, {'Retry-After': '600'}), 1) is None
+    # Retry-After of other statuses is ignored
+    assert policy.get_delay(response_error(500, {'Retry-After': '7'}), 1) == 0.1
+
+
+def test_parse_retry_after():
+    assert parse_retry_after('3') == 3
+    assert parse_retry_after('-1') == 0
+    assert parse_retry_after('soon') is None
+    assert parse_retry_after(None) is None
+    date = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=30), usegmt=True)
+    assert 25 < parse_retry_after(date) <= 30
+
+
+async def text(url, r, session):
+    return r.decode()
+
+
+def test_retries_in_run(server):
+    server.fails = 2
+    urls = [f'{server.url}/fail/{i}' for i in range(3)] + [f'{server.url}/status/404']
+    runner = (AsyncRequests().visuals_settings(use_statusbar=False, print_errors_string=False)
+              .set_retry_policy(RetryPolicy(max_tries=3, backoff=0.01)))
+
+    assert runner.run(urls, text) == ['ok 0', 'ok 1', 'ok 2', None]
+    assert server.failures == {'0': 3, '1': 3, '2': 3}
+    # 404 is not retried
+    assert sum(path == '/status/404' for path, _ in server.requests) == 1
+    assert runner.errors.total == 1